@@ -1,23 +1,60 @@
 import os
-from flask import Flask, request, redirect, url_for, render_template, send_from_directory, flash
+from flask import Flask, request, redirect, url_for, render_template, send_from_directory, flash, jsonify, Response, abort
 from werkzeug.utils import secure_filename
 import subprocess # To call your po_processor.py script
 import uuid # To create unique filenames
 import sys
 import traceback
+import gzip
+import mimetypes
+import threading
+from collections import OrderedDict
+from retention import RetentionManager
 
 # --- Configuration ---
 # It's good practice to put these in environment variables or a config file for production
 # For simplicity here, we define them directly.
-UPLOAD_FOLDER = '/tmp/uploads' if not os.environ.get('VERCEL_ENV') else '/tmp'
-OUTPUT_FOLDER = '/tmp/outputs' if not os.environ.get('VERCEL_ENV') else '/tmp'
+UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', '/tmp/uploads' if not os.environ.get('VERCEL_ENV') else '/tmp')
+OUTPUT_FOLDER = os.environ.get('OUTPUT_FOLDER', '/tmp/outputs' if not os.environ.get('VERCEL_ENV') else '/tmp')
 ALLOWED_EXTENSIONS = {'xlsx'}
+# Disk retention for uploaded workbooks and generated outputs (size cap, age cap, LRU eviction)
+RETENTION_MAX_BYTES = int(os.environ.get('RETENTION_MAX_BYTES', 256 * 1024 * 1024)) # 256 MB
+RETENTION_MAX_AGE_SECONDS = int(os.environ.get('RETENTION_MAX_AGE_SECONDS', 24 * 60 * 60)) # 1 day
+RETENTION_SWEEP_INTERVAL_SECONDS = int(os.environ.get('RETENTION_SWEEP_INTERVAL_SECONDS', 5 * 60))
+# A po_processor.py run is stopped after this long. Files modified more recently than the
+# timeout plus a margin are never evicted, so a job running in another worker process
+# (whose job ids this process cannot see) keeps its input and config.
+PROCESS_TIMEOUT_SECONDS = int(os.environ.get('PROCESS_TIMEOUT_SECONDS', 10 * 60))
+RETENTION_MIN_AGE_SECONDS = int(os.environ.get('RETENTION_MIN_AGE_SECONDS', PROCESS_TIMEOUT_SECONDS + 60))
+# Planning state left by the most recent successful run, served by the ATP quote endpoint
+PLANNING_STATE_FILE = os.environ.get('PLANNING_STATE_FILE', os.path.join(OUTPUT_FOLDER, 'planning_state.pkl'))
+# Build the output workbook in memory and return it in the upload response, instead of
+# writing it to OUTPUT_FOLDER and redirecting to /outputs/<filename>. On by default on Vercel,
+# where /tmp is slow and size-limited. This trades memory for the disk round trip: the whole
+# workbook is held in the po_processor.py process and again in the web worker until the
+# response is sent, per concurrent upload. Nothing is saved, so /outputs/ serves nothing.
+IN_MEMORY_OUTPUT = os.environ.get('IN_MEMORY_OUTPUT', '1' if os.environ.get('VERCEL_ENV') else '0') == '1'
+# Downloads of other formats are gzipped for clients that accept it, from this size. XLSX files
+# are zip archives already and are never gzipped, so in practice this only applies to profiles.
+GZIP_MIN_BYTES = 1024
+# Number of stored result sheets kept loaded (and indexed) for the results API
+RESULT_TABLE_CACHE_SIZE = int(os.environ.get('RESULT_TABLE_CACHE_SIZE', 8))
 
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['OUTPUT_FOLDER'] = OUTPUT_FOLDER
+app.config['PLANNING_STATE_FILE'] = PLANNING_STATE_FILE
+app.config['IN_MEMORY_OUTPUT'] = IN_MEMORY_OUTPUT
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16 MB limit
 
+retention_manager = RetentionManager(
+    [UPLOAD_FOLDER, OUTPUT_FOLDER],
+    max_bytes=RETENTION_MAX_BYTES,
+    max_age_seconds=RETENTION_MAX_AGE_SECONDS,
+    sweep_interval_seconds=RETENTION_SWEEP_INTERVAL_SECONDS,
+    min_age_seconds=RETENTION_MIN_AGE_SECONDS
+)
+
 # Use the environment variable for SECRET_KEY, with a fallback for local development if needed
 app.secret_key = os.environ.get('SECRET_KEY', 'a_default_fallback_key_for_development_only')
 
@@ -30,7 +67,77 @@ def ensure_dir(directory):
     if not os.path.exists(directory):
         os.makedirs(directory)
 
+def download_response(data, download_name, mimetype=None):
+    """Returns in-memory bytes as a file download, gzipped when that helps and the client accepts it.
+
+    XLSX workbooks are sent as they are; only other formats (profile artifacts) are gzipped.
+    """
+    mimetype = mimetype or mimetypes.guess_type(download_name)[0] or 'application/octet-stream'
+    headers = {'Content-Disposition': f'attachment; filename="{download_name}"'}
+    if not download_name.lower().endswith('.xlsx') and len(data) >= GZIP_MIN_BYTES:
+        headers['Vary'] = 'Accept-Encoding'
+        if 'gzip' in request.accept_encodings:
+            data = gzip.compress(data, compresslevel=6)
+            headers['Content-Encoding'] = 'gzip'
+    # A bytes body gets an exact Content-Length, so clients can show download progress
+    return Response(data, mimetype=mimetype, headers=headers)
+
+# Resident copy of the planning state, reloaded only when a newer run has replaced the file.
+# Requests run in threads, so the cache is read and replaced under a lock.
+_planning_state_cache = {'mtime': None, 'state': None}
+_planning_state_lock = threading.Lock()
+
+def get_planning_state():
+    from atp_quote import load_planning_state # Imported lazily like pandas in upload_file
+    state_file = app.config['PLANNING_STATE_FILE']
+    with _planning_state_lock:
+        try:
+            mtime = os.path.getmtime(state_file)
+        except OSError:
+            return None
+        if _planning_state_cache['mtime'] != mtime:
+            _planning_state_cache['state'] = load_planning_state(state_file)
+            _planning_state_cache['mtime'] = mtime
+        return _planning_state_cache['state']
+
+# Most recently queried result sheets, keyed by (job id, sheet); a file replaced on disk is reloaded
+_result_table_cache = OrderedDict()
+_result_table_lock = threading.Lock()
+
+def get_result_table(job_id, sheet):
+    """Returns the job's ResultTable for a sheet, or None if its results are gone."""
+    from results_store import result_file_path, load_result_table
+    key = (job_id, sheet)
+    path = result_file_path(os.path.join(app.config['OUTPUT_FOLDER'], job_id), sheet)
+    try:
+        if path is None:
+            raise FileNotFoundError(key)
+        # Identify the file by inode: results are replaced by rename, while touch() changes mtime
+        identity = (path, os.stat(path).st_ino)
+        with _result_table_lock:
+            cached = _result_table_cache.get(key)
+        if cached is None or cached[0] != identity:
+            # Loaded outside the lock, so a slow load does not hold up lookups of other sheets
+            cached = (identity, load_result_table(path))
+    except OSError:
+        # Missing, or removed by retention between the checks above
+        with _result_table_lock:
+            _result_table_cache.pop(key, None)
+        return None
+    retention_manager.touch(path)
+    with _result_table_lock:
+        _result_table_cache[key] = cached
+        _result_table_cache.move_to_end(key)
+        while len(_result_table_cache) > RESULT_TABLE_CACHE_SIZE:
+            _result_table_cache.popitem(last=False)
+    return cached[1]
+
 # --- Routes ---
+@app.before_request
+def periodic_retention_sweep():
+    # Throttled inside the manager, so most requests only compare two timestamps
+    retention_manager.maybe_sweep()
+
 @app.route('/', methods=['GET', 'POST'])
 def upload_file():
     ensure_dir(app.config['UPLOAD_FOLDER'])
@@ -56,11 +163,17 @@ def upload_file():
 
                 input_filepath = os.path.join(app.config['UPLOAD_FOLDER'], input_filename)
                 output_filepath = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
+                # In memory, po_processor.py writes the workbook to its stdout ('-') and logs to stderr
+                in_memory_output = app.config['IN_MEMORY_OUTPUT']
+                # "Capture profile" checkbox on the form, or ?profile=1 for scripted uploads
+                profile_requested = request.values.get('profile', '').lower() in ('1', 'true', 'on', 'yes')
 
-                file.save(input_filepath)
-                # Flash message moved to after potential processing error for better UX
-
+                # Files of a running job (input, temp config, results) are kept out of retention sweeps
+                retention_manager.begin_job(unique_id)
                 try:
+                    file.save(input_filepath)
+                    # Flash message moved to after potential processing error for better UX
+
                     import pandas as pd  # Import pandas only when needed
                     import config as original_config_module
 
@@ -71,7 +184,7 @@ def upload_file():
                     temp_config_content = (
                         f"# Temporary configuration generated by app.py\n"
                         f"INPUT_EXCEL_FILE = r'''{input_filepath}'''\n"
-                        f"OUTPUT_EXCEL_FILE = r'''{output_filepath}'''\n"
+                        f"OUTPUT_EXCEL_FILE = r'''{'-' if in_memory_output else output_filepath}'''\n"
                         f"\n"
                         f"# Carry over other essential configurations from the original config.py's defaults\n"
                         f"TODAY_DATE_STR = '''{escape_config_string(original_config_module.TODAY_DATE_STR_DEFAULT)}'''\n"
@@ -81,7 +194,13 @@ def upload_file():
                         f"MIN_CAPACITY_REMAIN = {original_config_module.MIN_CAPACITY_REMAIN_DEFAULT}\n"
                         f"OCD_COL_NAME = '''{escape_config_string(original_config_module.OCD_COL_NAME_DEFAULT)}'''\n"
                         f"FAR_FUTURE_DATE_DISPLAY_STR = '''{escape_config_string(original_config_module.FAR_FUTURE_DATE_DISPLAY_STR_DEFAULT)}'''\n"
+                        f"PARALLEL_LOAD = {original_config_module.PARALLEL_LOAD_DEFAULT}\n"
+                        f"PLANNING_STATE_FILE = r'''{app.config['PLANNING_STATE_FILE']}'''\n"
+                        f"RESULTS_STORE_PREFIX = r'''{os.path.join(app.config['OUTPUT_FOLDER'], unique_id)}'''\n"
                     )
+                    if profile_requested:
+                        # Profile artifacts share the job's prefix, so retention covers them too
+                        temp_config_content += f"PROFILE_OUTPUT_PREFIX = r'''{os.path.join(app.config['OUTPUT_FOLDER'], unique_id)}'''\n"
                     
                     temp_config_filename = f"{unique_id}_config.py"
                     temp_config_path = os.path.join(app.config['UPLOAD_FOLDER'], temp_config_filename)
@@ -96,12 +215,36 @@ def upload_file():
                     process = subprocess.run(
                         [python_executable, script_path],
                         env=dict(os.environ, PO_PROCESSOR_CONFIG=temp_config_path),
-                        capture_output=True, text=True, check=False,
-                        cwd=project_root
+                        capture_output=True, text=not in_memory_output, check=False,
+                        cwd=project_root, timeout=PROCESS_TIMEOUT_SECONDS
                     )
 
-                    if process.returncode == 0 and os.path.exists(output_filepath):
-                        flash(f'File "{original_filename}" processed successfully!')
+                    workbook_bytes = None
+                    if in_memory_output:
+                        workbook_bytes = process.stdout
+                        process.stdout = '' # Progress output is on stderr in this mode
+                        process.stderr = process.stderr.decode(errors='replace')
+                    output_ready = bool(workbook_bytes) if in_memory_output else os.path.exists(output_filepath)
+
+                    if process.returncode == 0 and output_ready:
+                        # Enforce the caps on write, keeping the output the client is about to fetch
+                        retention_manager.sweep(protect=[] if in_memory_output else [output_filepath])
+                        profile_url = url_for("job_profile", job_id=unique_id, artifact="json") if profile_requested else None
+                        if in_memory_output:
+                            # Sent straight back: no disk write, disk read or redirect round trip.
+                            # No page is rendered after an attachment, so the job details go in headers
+                            # instead of flash messages (which would otherwise pile up in the session).
+                            response = download_response(
+                                workbook_bytes, output_filename,
+                                'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+                            )
+                            response.headers['X-Job-Id'] = unique_id
+                            if profile_url:
+                                response.headers['X-Profile-Url'] = profile_url
+                            return response
+                        flash(f'File "{original_filename}" processed successfully! Job ID: {unique_id}')
+                        if profile_url:
+                            flash(f'Profile saved: {profile_url} (also available as pstats and collapsed)')
                         return redirect(url_for('download_file', filename=output_filename))
                     else:
                         # Construct a more detailed error message
@@ -110,11 +253,14 @@ def upload_file():
                             error_detail += f" Stderr: {process.stderr.strip()}"
                         if process.stdout:
                             error_detail += f" Stdout: {process.stdout.strip()}"
-                        if not os.path.exists(output_filepath) and process.returncode == 0:
+                        if not output_ready and process.returncode == 0:
                              error_detail += " Output file was not found even after script reported success."
                         flash(f'Error processing file "{original_filename}". {error_detail}')
                         return redirect(request.url)
 
+                except subprocess.TimeoutExpired:
+                    flash(f'Error processing file "{original_filename}". Processing did not finish within {PROCESS_TIMEOUT_SECONDS} seconds.')
+                    return redirect(request.url)
                 except ImportError as e:
                     error_detail = f"Import error: {str(e)}\n{traceback.format_exc()}"
                     flash(f'Error importing required libraries. {error_detail}')
@@ -127,10 +273,10 @@ def upload_file():
                     # Clean up temporary files in all cases (success, error, exception)
                     if temp_config_path and os.path.exists(temp_config_path):
                         os.remove(temp_config_path)
-                    # Optionally, remove input_filepath on failure or always after processing
-                    # For now, keeping it for easier debugging if an error occurs
-                    # if input_filepath and os.path.exists(input_filepath):
-                    #     os.remove(input_filepath)
+                    # The uploaded workbook is not needed once the job has finished
+                    if input_filepath and os.path.exists(input_filepath):
+                        os.remove(input_filepath)
+                    retention_manager.end_job(unique_id)
             else:
                 flash('Allowed file types are .xlsx')
                 return redirect(request.url)
@@ -143,8 +289,81 @@ def upload_file():
 
 @app.route('/outputs/<filename>')
 def download_file(filename):
+    if app.config['IN_MEMORY_OUTPUT']:
+        # Workbooks are returned in the upload response and never saved in this mode
+        abort(404, description='Outputs are not stored when IN_MEMORY_OUTPUT is on; the workbook is returned by the upload itself.')
+    retention_manager.touch(os.path.join(app.config['OUTPUT_FOLDER'], secure_filename(filename)))
     return send_from_directory(app.config['OUTPUT_FOLDER'], filename, as_attachment=True)
 
+@app.route('/api/storage-usage')
+def storage_usage():
+    """Reports disk usage of the upload/output folders for monitoring."""
+    return jsonify(retention_manager.usage())
+
+@app.route('/api/atp-quote', methods=['POST'])
+def atp_quote():
+    """Quotes ETDs for one prospective line, or for {"lines": [...]}, against the last processed state.
+
+    Each line needs Greige Code, COLOR, quantity and CHD. Nothing is committed.
+    """
+    payload = request.get_json(silent=True)
+    if payload is None:
+        return jsonify({'error': 'Request body must be JSON.'}), 400
+    try:
+        from atp_quote import parse_quote_lines, quote_lines
+        lines = parse_quote_lines(payload)
+        planning_state = get_planning_state()
+        if planning_state is None:
+            return jsonify({'error': 'No processed state available yet. Upload and process a workbook first.'}), 503
+        quotes = quote_lines(planning_state, lines)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Quote error: {str(e)}'}), 500
+    return jsonify({'state_created_at': planning_state['created_at'], 'quotes': quotes})
+
+@app.route('/api/jobs/<job_id>/results/<sheet>')
+def job_results(job_id, sheet):
+    """Serves rows of a processed job's final-etd, draft-etd or remaining-stock sheet as JSON.
+
+    Supports po/greige_code/color filters, etd_from/etd_to (YYYY-MM-DD), sort (prefix - for
+    descending), limit and cursor (the next_cursor of the previous page).
+    """
+    try:
+        job_id = str(uuid.UUID(job_id))
+    except ValueError:
+        return jsonify({'error': 'Invalid job id.'}), 404
+    try:
+        from results_store import parse_results_query, query_results
+        query = parse_results_query(request.args, sheet)
+        table = get_result_table(job_id, sheet)
+        if table is None:
+            return jsonify({'error': f'No results found for job {job_id}.'}), 404
+        page = query_results(table, query)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Results error: {str(e)}'}), 500
+    return jsonify(dict(job_id=job_id, **page))
+
+@app.route('/api/jobs/<job_id>/profile/<artifact>')
+def job_profile(job_id, artifact):
+    """Downloads a profiled job's profile: pstats, collapsed (flamegraph stacks) or json (summary)."""
+    from profiling import profile_artifact_paths
+    try:
+        job_id = str(uuid.UUID(job_id))
+    except ValueError:
+        return jsonify({'error': 'Invalid job id.'}), 404
+    paths = profile_artifact_paths(os.path.join(app.config['OUTPUT_FOLDER'], job_id))
+    if artifact not in paths:
+        return jsonify({'error': f"Unknown profile artifact '{artifact}'. Expected one of: {', '.join(paths)}."}), 400
+    if not os.path.exists(paths[artifact]):
+        return jsonify({'error': f'No profile found for job {job_id}.'}), 404
+    retention_manager.touch(paths[artifact])
+    with open(paths[artifact], 'rb') as f:
+        # Profiles are text-heavy and compress well
+        return download_response(f.read(), os.path.basename(paths[artifact]))
+
 if __name__ == '__main__':
     # For local development:
     app.run(debug=True)
@@ -0,0 +1,190 @@
+import os
+import pickle
+import tempfile
+from collections import ChainMap
+import numpy as np
+import pandas as pd
+from day_ordinals import date_to_day_ordinal, day_ordinal_to_date
+from step1_draft_etd import allocate_stock_for_po
+from step2_second_etd import second_etd_from_lot_status
+from step3_final_etd import schedule_po_on_capacity
+
+# --- Available-to-promise (ATP) quotes ---
+# After a run, the state Steps 1-3 leave behind (remaining stock, 1st lot status and the
+# capacity calendar after scheduling) is kept as plain dictionaries keyed the way the
+# rules look them up, with dates as day ordinals (see day_ordinals.py). A quote replays the Step 1-3 rules for prospective lines against a
+# scratch overlay of that state, so nothing is ever committed.
+
+def build_planning_state(stock_state, first_lot_df, live_capacity, today_date, lead_time_days,
+                         capacity_tolerance, min_capacity_remain, far_future_display_str):
+    """Builds the indexed planning state used for ATP quotes from the outputs of Steps 1-3."""
+    lot_status_index = {}
+    due_date_never = first_lot_df['Is_Due_Date_Never'] if 'Is_Due_Date_Never' in first_lot_df.columns else [False] * len(first_lot_df)
+    for greige_code, color, status, due_date, never in zip(first_lot_df['Greige Code'], first_lot_df['COLOR'],
+                                                           first_lot_df['STATUS'], first_lot_df['DUE DATE'].tolist(),
+                                                           due_date_never):
+        # Step 2 merges on these keys; with repeated keys the first row is used for a quote
+        lot_status_index.setdefault((_normalize_code(greige_code), _normalize_color(color)), (status, due_date, bool(never)))
+
+    return {
+        'stock': {
+            _normalize_code(code): {
+                'available_on_hand': info['available_on_hand'],
+                'incoming_batches': [batch.copy() for batch in info['incoming_batches'] if batch['quantity'] > 0]
+            }
+            for code, info in stock_state.items()
+        },
+        'lot_status': lot_status_index,
+        'capacity': dict(live_capacity),
+        'params': {
+            'today_date': today_date,
+            'lead_time_days': lead_time_days,
+            'capacity_tolerance': capacity_tolerance,
+            'min_capacity_remain': min_capacity_remain,
+            'far_future_display_str': far_future_display_str,
+        },
+        'created_at': pd.Timestamp.now().isoformat(),
+    }
+
+def save_planning_state(planning_state, state_file):
+    """Writes the planning state atomically so a reader never sees a half-written file."""
+    print(f"Saving planning state to {state_file}...")
+    state_dir = os.path.dirname(os.path.abspath(state_file))
+    fd, tmp_path = tempfile.mkstemp(dir=state_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(planning_state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, state_file)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def load_planning_state(state_file):
+    """Loads a planning state written by save_planning_state."""
+    with open(state_file, 'rb') as f:
+        return pickle.load(f)
+
+def parse_quote_lines(payload):
+    """Validates a quote request (one line, or {"lines": [...]}) and returns a list of normalized lines.
+
+    Raises ValueError with a user-facing message if a line is malformed.
+    """
+    if isinstance(payload, dict) and 'lines' in payload:
+        raw_lines = payload['lines']
+    else:
+        raw_lines = [payload]
+    if not isinstance(raw_lines, list) or not raw_lines:
+        raise ValueError("Expected a quote line object or a non-empty 'lines' list.")
+
+    lines = []
+    for i, raw in enumerate(raw_lines):
+        if not isinstance(raw, dict):
+            raise ValueError(f"Line {i}: expected an object.")
+        missing = [key for key in ('Greige Code', 'COLOR', 'CHD') if raw.get(key) in (None, '')]
+        quantity = raw.get('quantity', raw.get('Quantity request'))
+        if quantity in (None, ''):
+            missing.append('quantity')
+        if missing:
+            raise ValueError(f"Line {i}: missing {', '.join(missing)}.")
+
+        quantity = pd.to_numeric(quantity, errors='coerce')
+        if pd.isna(quantity) or not np.isfinite(quantity) or quantity <= 0:
+            raise ValueError(f"Line {i}: quantity must be a positive, finite number.")
+        chd = date_to_day_ordinal(pd.to_datetime(raw['CHD'], errors='coerce'))
+        if chd is None:
+            raise ValueError(f"Line {i}: CHD is not a valid date.")
+
+        lines.append({
+            'Greige Code': _normalize_code(raw['Greige Code']),
+            'COLOR': _normalize_color(raw['COLOR']),
+            'Quantity request': quantity,
+            'CHD': chd,
+        })
+    return lines
+
+def quote_lines(planning_state, lines):
+    """Quotes Draft, 2nd and Final ETD for prospective lines without changing planning_state.
+
+    Lines in one call are quoted together, as if they were ordered at the same time:
+    stock is allocated in CHD order and capacity is booked in 2nd ETD order, as in Steps 1 and 3.
+    """
+    params = planning_state['params']
+    today_date = params['today_date']
+    lead_time_days = params['lead_time_days']
+
+    # Scratch overlays: stock is copied per Greige Code on first touch, capacity writes
+    # go to the front map of the ChainMap and never reach the resident calendar.
+    scratch_stock = {}
+    scratch_capacity = ChainMap({}, planning_state['capacity'])
+
+    quotes = [dict(line) for line in lines]
+
+    # Step 1 rules: allocate remaining stock
+    for quote in sorted(quotes, key=lambda q: q['CHD']):
+        code = quote['Greige Code']
+        if code not in scratch_stock:
+            base = planning_state['stock'].get(code, {'available_on_hand': 0, 'incoming_batches': []})
+            scratch_stock[code] = {
+                'available_on_hand': base['available_on_hand'],
+                'incoming_batches': [batch.copy() for batch in base['incoming_batches']]
+            }
+        quote['Draft ETD'] = allocate_stock_for_po(
+            scratch_stock[code], quote['Quantity request'], today_date, lead_time_days
+        )
+
+    # Step 2 rules: 1st lot status
+    for quote in quotes:
+        lot_status, due_date, due_date_never = planning_state['lot_status'].get(
+            (quote['Greige Code'], quote['COLOR']), (None, None, False)
+        )
+        quote['1ST LOT STATUS'] = lot_status
+        quote['DUE DATE'] = due_date
+        quote['2nd ETD'] = second_etd_from_lot_status(quote['Draft ETD'], lot_status, due_date, due_date_never)
+
+    # Step 3 rules: book capacity
+    def schedule_order(q):
+        schedulable = pd.notna(q['2nd ETD'])
+        return (not schedulable, q['2nd ETD'] if schedulable else 0, q['CHD'])
+
+    for quote in sorted(quotes, key=schedule_order):
+        dev_qty1, date1, dev_qty2, date2, final_scheduled_qty, final_etd_val = schedule_po_on_capacity(
+            quote['Quantity request'], quote['2nd ETD'], scratch_capacity, today_date, lead_time_days,
+            params['capacity_tolerance'], params['min_capacity_remain']
+        )
+        quote['DEVIDED QUANTITY 1ST'] = dev_qty1
+        quote['DATE 1ST BATCH'] = date1
+        quote['DEVIDED QUANTITY 2ND'] = dev_qty2
+        quote['DATE 2ND BATCH'] = date2
+        quote['FINAL QUANTITY'] = final_scheduled_qty if final_scheduled_qty > 0 else quote['Quantity request']
+        quote['FINAL ETD'] = final_etd_val
+
+    return [_quote_to_json(quote, params['far_future_display_str']) for quote in quotes]
+
+def _quote_to_json(quote, far_future_display_str):
+    result = {}
+    for key, value in quote.items():
+        if key in ('CHD', 'DUE DATE', 'DATE 1ST BATCH', 'DATE 2ND BATCH'):
+            result[key] = None if pd.isna(value) else day_ordinal_to_date(value).strftime('%Y-%m-%d')
+        elif key in ('Draft ETD', '2nd ETD', 'FINAL ETD'):
+            result[key] = far_future_display_str if pd.isna(value) else day_ordinal_to_date(value).strftime('%Y-%m-%d')
+        elif key in ('Quantity request', 'DEVIDED QUANTITY 1ST', 'DEVIDED QUANTITY 2ND', 'FINAL QUANTITY'):
+            result[key] = None if pd.isna(value) else float(value)
+        else:
+            result[key] = value
+    return result
+
+def _normalize_code(greige_code):
+    # Greige Code is always handled as text (see step2_second_etd). A numeric code read
+    # from a column with blanks comes back as a float (12345.0), and as "12345.0" once
+    # cast to text, so an integer-valued code is reduced to its digits on both sides.
+    if isinstance(greige_code, (float, np.floating)) and np.isfinite(greige_code) and float(greige_code).is_integer():
+        greige_code = int(greige_code)
+    code = str(greige_code).strip()
+    if code.endswith('.0') and code[:-2].isdigit():
+        code = code[:-2]
+    return code
+
+def _normalize_color(color):
+    # Same cleanup Step 2 applies to COLOR before merging
+    return ' '.join(str(color).split())
@@ -11,7 +11,7 @@ _ENV_CONFIG_PATH = os.getenv('PO_PROCESSOR_CONFIG')
 
 # Default values (these will be used if not overridden by the temp config)
 INPUT_EXCEL_FILE_DEFAULT = 'PO - Request.xlsx'
-OUTPUT_EXCEL_FILE_DEFAULT = 'Output_Stock_Management.xlsx'
+OUTPUT_EXCEL_FILE_DEFAULT = 'Output_Stock_Management.xlsx' # '-' writes the workbook to stdout; it is built fully in memory first (see IN_MEMORY_OUTPUT in app.py)
 TODAY_DATE_STR_DEFAULT = date.today().strftime('%Y-%m-%d') # Default to today
 LEAD_TIME_DAYS_DEFAULT = 40
 FAR_FUTURE_DATE_STR_DEFAULT = '2200-12-31'
@@ -19,6 +19,19 @@ CAPACITY_TOLERANCE_DEFAULT = 2000
 MIN_CAPACITY_REMAIN_DEFAULT = -2000
 OCD_COL_NAME_DEFAULT = "OCD( Order Creation Day)"
 FAR_FUTURE_DATE_DISPLAY_STR_DEFAULT = 'Insufficient Stock/Capacity'
+PARALLEL_LOAD_DEFAULT = False # Parse and clean the input sheets in parallel worker processes
+PREVIOUS_SNAPSHOT_FILE_DEFAULT = None # Result snapshot of the previous run to diff against (.csv or .parquet)
+SNAPSHOT_FILE_DEFAULT = None # Where to save this run's result snapshot (.csv or .parquet)
+DELTA_OUTPUT_FILE_DEFAULT = None # Standalone delta report (.csv or .parquet); None writes an ETD DELTA sheet instead
+PLANNING_STATE_FILE_DEFAULT = None # Where to save the post-run planning state used for ATP quotes
+STAGE_CACHE_DIR_DEFAULT = None # Directory for materialized stage outputs; None runs every stage without caching
+STAGE_CACHE_MAX_BYTES_DEFAULT = 512 * 1024 * 1024 # Least recently used stage cache entries are removed beyond this size
+STAGE_CACHE_MAX_AGE_SECONDS_DEFAULT = 7 * 24 * 3600 # Stage cache entries unused for this long are removed
+RESULTS_STORE_PREFIX_DEFAULT = None # Path prefix for columnar copies of the output sheets (served by the results API); None skips them
+PROFILE_OUTPUT_PREFIX_DEFAULT = None # Path prefix for profiling artifacts of a run; None runs without profiling
+RERUN_FROM_STAGE_DEFAULT = None # Force this stage ('load', 'step1', 'step2', 'step3') and everything downstream to re-run
+# Text date formats tried, in order, for input date columns (real dates and Excel serial numbers are detected automatically)
+DATE_STRING_FORMATS_DEFAULT = ['%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y', '%Y/%m/%d', '%d/%m/%y', '%d-%b-%Y', '%d %b %Y']
 
 if _ENV_CONFIG_PATH and os.path.exists(_ENV_CONFIG_PATH):
     # If the environment variable is set and the temp config file exists,
@@ -50,6 +63,18 @@ else:
     MIN_CAPACITY_REMAIN = MIN_CAPACITY_REMAIN_DEFAULT
     OCD_COL_NAME = OCD_COL_NAME_DEFAULT
     FAR_FUTURE_DATE_DISPLAY_STR = FAR_FUTURE_DATE_DISPLAY_STR_DEFAULT
+    PARALLEL_LOAD = PARALLEL_LOAD_DEFAULT
+    PREVIOUS_SNAPSHOT_FILE = PREVIOUS_SNAPSHOT_FILE_DEFAULT
+    SNAPSHOT_FILE = SNAPSHOT_FILE_DEFAULT
+    DELTA_OUTPUT_FILE = DELTA_OUTPUT_FILE_DEFAULT
+    PLANNING_STATE_FILE = PLANNING_STATE_FILE_DEFAULT
+    STAGE_CACHE_DIR = STAGE_CACHE_DIR_DEFAULT
+    STAGE_CACHE_MAX_BYTES = STAGE_CACHE_MAX_BYTES_DEFAULT
+    STAGE_CACHE_MAX_AGE_SECONDS = STAGE_CACHE_MAX_AGE_SECONDS_DEFAULT
+    RESULTS_STORE_PREFIX = RESULTS_STORE_PREFIX_DEFAULT
+    PROFILE_OUTPUT_PREFIX = PROFILE_OUTPUT_PREFIX_DEFAULT
+    RERUN_FROM_STAGE = RERUN_FROM_STAGE_DEFAULT
+    DATE_STRING_FORMATS = DATE_STRING_FORMATS_DEFAULT
 
 # --- Date Conversions ---
 # These should use the variables (either from exec or defaults)
@@ -69,6 +94,18 @@ if 'FAR_FUTURE_DATE_DISPLAY_STR' not in globals(): FAR_FUTURE_DATE_DISPLAY_STR =
 if 'CAPACITY_TOLERANCE' not in globals(): CAPACITY_TOLERANCE = CAPACITY_TOLERANCE_DEFAULT
 if 'MIN_CAPACITY_REMAIN' not in globals(): MIN_CAPACITY_REMAIN = MIN_CAPACITY_REMAIN_DEFAULT
 if 'OCD_COL_NAME' not in globals(): OCD_COL_NAME = OCD_COL_NAME_DEFAULT
+if 'PARALLEL_LOAD' not in globals(): PARALLEL_LOAD = PARALLEL_LOAD_DEFAULT
+if 'PREVIOUS_SNAPSHOT_FILE' not in globals(): PREVIOUS_SNAPSHOT_FILE = PREVIOUS_SNAPSHOT_FILE_DEFAULT
+if 'SNAPSHOT_FILE' not in globals(): SNAPSHOT_FILE = SNAPSHOT_FILE_DEFAULT
+if 'DELTA_OUTPUT_FILE' not in globals(): DELTA_OUTPUT_FILE = DELTA_OUTPUT_FILE_DEFAULT
+if 'PLANNING_STATE_FILE' not in globals(): PLANNING_STATE_FILE = PLANNING_STATE_FILE_DEFAULT
+if 'STAGE_CACHE_DIR' not in globals(): STAGE_CACHE_DIR = STAGE_CACHE_DIR_DEFAULT
+if 'STAGE_CACHE_MAX_BYTES' not in globals(): STAGE_CACHE_MAX_BYTES = STAGE_CACHE_MAX_BYTES_DEFAULT
+if 'STAGE_CACHE_MAX_AGE_SECONDS' not in globals(): STAGE_CACHE_MAX_AGE_SECONDS = STAGE_CACHE_MAX_AGE_SECONDS_DEFAULT
+if 'RESULTS_STORE_PREFIX' not in globals(): RESULTS_STORE_PREFIX = RESULTS_STORE_PREFIX_DEFAULT
+if 'PROFILE_OUTPUT_PREFIX' not in globals(): PROFILE_OUTPUT_PREFIX = PROFILE_OUTPUT_PREFIX_DEFAULT
+if 'RERUN_FROM_STAGE' not in globals(): RERUN_FROM_STAGE = RERUN_FROM_STAGE_DEFAULT
+if 'DATE_STRING_FORMATS' not in globals(): DATE_STRING_FORMATS = DATE_STRING_FORMATS_DEFAULT
 
 
 # --- Original Configuration (Comment out or remove the old static assignments for these) ---
@@ -1,30 +1,236 @@
 import pandas as pd
-from config import excel_date_to_datetime # Assuming config.py is in the same directory
+import numpy as np
+import datetime
+import io
+import os
+import posixpath
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree import ElementTree
+from config import excel_date_to_datetime, DATE_STRING_FORMATS # Assuming config.py is in the same directory
 
-def load_and_prepare_data(input_file, ocd_col_name):
-    """Loads data from Excel sheets and performs initial cleaning and preparation."""
+INPUT_SHEET_NAMES = ['Stock', 'PO', '1ST LOT STATUS', 'Capacity Status']
+
+EXCEL_EPOCH = '1899-12-30'
+# Serial numbers above this are past 9999-12-31 and cannot be Excel dates
+MAX_EXCEL_SERIAL = 2958465
+# Numeric text is only read as a serial within this range (1950-01-01 to 2099-12-31)
+TEXT_SERIAL_RANGE = (18264, 73050)
+_NATIVE_DATE_TYPES = (datetime.datetime, datetime.date, np.datetime64)
+_NATIVE_DATE_KINDS = ('datetime64', 'datetime', 'date')
+_NUMBER_KINDS = ('integer', 'floating', 'mixed-integer-float', 'decimal')
+
+_SPREADSHEET_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+_RELATIONSHIP_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+
+def normalize_date_column(values, string_formats=None):
+    """Converts a column mixing real dates, Excel serial numbers and text dates to datetime64.
+
+    Vectorized counterpart of config.excel_date_to_datetime. The column's inferred type
+    decides the conversion: real dates are converted as they are, numbers are read as
+    Excel serials, and text is tried against each of ``string_formats`` (default:
+    config.DATE_STRING_FORMATS) in order. Numeric text only counts as a serial within
+    TEXT_SERIAL_RANGE, so text like "2024" is not read as a day in 1905.
+    Only columns mixing these kinds are split value by value.
+    Returns (dates, unparsed_count), where unparsed_count is the number of non-empty
+    values that could not be read as a date and became NaT.
+    """
+    if string_formats is None:
+        string_formats = DATE_STRING_FORMATS
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.astype('datetime64[ns]'), 0
+
+    result = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+    kind = pd.api.types.infer_dtype(values, skipna=True)
+    if kind in _NATIVE_DATE_KINDS:
+        kinds = pd.Series('date', index=values.index)
+    elif kind in _NUMBER_KINDS:
+        kinds = pd.Series('number', index=values.index)
+    elif kind in ('string', 'empty'):
+        kinds = pd.Series('text', index=values.index)
+    else:
+        kinds = values.map(_date_value_kind)
+    is_blank = values.isna()
+    if kinds.eq('text').any():
+        is_blank |= kinds.eq('text') & values.astype(str).str.strip().eq('')
+    kinds = kinds.where(~is_blank, 'blank')
+
+    # Native dates (datetime/date/Timestamp objects from openpyxl)
+    is_native = kinds.eq('date')
+    if is_native.any():
+        result[is_native] = pd.to_datetime(values[is_native], errors='coerce')
+
+    # Excel serial numbers: any positive number, or numeric text in the plausible range
+    is_number = kinds.eq('number')
+    is_text = kinds.eq('text')
+    text = values.astype(object).where(is_text)
+    if is_text.any():
+        text = text.str.strip()
+    serials = pd.to_numeric(values.where(is_number), errors='coerce').astype('float64')
+    is_serial = serials.notna() & (serials > 0) & (serials <= MAX_EXCEL_SERIAL)
+    if is_text.any():
+        text_serials = pd.to_numeric(text, errors='coerce')
+        is_text_serial = text_serials.between(*TEXT_SERIAL_RANGE)
+        serials = serials.where(~is_text_serial, text_serials)
+        is_serial |= is_text_serial
+    if is_serial.any():
+        result[is_serial] = pd.to_datetime(serials[is_serial], unit='D', origin=EXCEL_EPOCH)
+
+    # Text dates: each configured format in turn on whatever is still unparsed;
+    # text matching none of them is left as NaT
+    pending = is_text & ~is_serial
+    for fmt in string_formats:
+        if not pending.any():
+            break
+        parsed = pd.to_datetime(text[pending], format=fmt, errors='coerce')
+        parsed = parsed[parsed.notna()]
+        result[parsed.index] = parsed
+        pending[parsed.index] = False
+
+    unparsed_count = int((result.isna() & ~is_blank).sum())
+    return result, unparsed_count
+
+def _date_value_kind(value):
+    # Booleans are numbers to Python, but never dates
+    if isinstance(value, (bool, np.bool_)):
+        return 'other'
+    if isinstance(value, _NATIVE_DATE_TYPES):
+        return 'date'
+    if isinstance(value, (int, float, np.number)):
+        return 'number'
+    if isinstance(value, str):
+        return 'text'
+    return 'other'
+
+def _normalize_date_columns(df, columns, sheet_name):
+    """Normalizes the given date columns in place and records unparsed counts in df.attrs['unparsed_dates']."""
+    unparsed = df.attrs.setdefault('unparsed_dates', {})
+    for col in columns:
+        if col not in df.columns:
+            continue
+        df[col], unparsed[col] = normalize_date_column(df[col])
+        if unparsed[col]:
+            print(f"Warning: {unparsed[col]} value(s) in column '{col}' of {sheet_name} sheet could not be read as dates.")
+
+def load_and_prepare_data(input_file, ocd_col_name, parallel=False, max_workers=None):
+    """Loads data from Excel sheets and performs initial cleaning and preparation.
+
+    With ``parallel=True`` the workbook is inflated once and each sheet is parsed and
+    cleaned in its own worker process, so on a multi-core machine the load takes roughly
+    as long as the largest sheet instead of the sum of all four. With one core (or
+    ``max_workers=1``) the sheets are read serially.
+    """
     print("Reading input data sheets...")
+    if max_workers is None:
+        max_workers = min(len(INPUT_SHEET_NAMES), os.cpu_count() or 1)
+    if parallel and max_workers > 1: # With a single core the worker pool only adds start-up time
+        return _load_and_prepare_data_parallel(input_file, ocd_col_name, max_workers)
+
     xls = pd.ExcelFile(input_file)
 
-    stock_df = xls.parse('Stock')
-    po_df = xls.parse('PO')
-    first_lot_df = xls.parse('1ST LOT STATUS')
-    capacity_status_df = xls.parse('Capacity Status')
+    stock_df = _clean_stock_sheet(xls.parse('Stock'))
+    po_df = _clean_po_sheet(xls.parse('PO'), ocd_col_name)
+    first_lot_df = _clean_first_lot_sheet(xls.parse('1ST LOT STATUS'))
+    capacity_status_df = _clean_capacity_sheet(xls.parse('Capacity Status'))
 
-    # Print debug information
-    print("\nDebug: First few rows of first_lot_df before cleaning:")
-    print(first_lot_df.head())
-    print("\nDebug: Columns in first_lot_df:")
-    print(first_lot_df.columns.tolist())
+    print("Input data read and preprocessed successfully.")
+    return stock_df, po_df, first_lot_df, capacity_status_df
+
+def _load_and_prepare_data_parallel(input_file, ocd_col_name, max_workers):
+    """Parses and cleans the four input sheets concurrently, inflating the workbook only once."""
+    if isinstance(input_file, (bytes, bytearray)):
+        workbook_bytes = bytes(input_file)
+    elif hasattr(input_file, 'read'):
+        workbook_bytes = input_file.read()
+    else:
+        with open(input_file, 'rb') as f:
+            workbook_bytes = f.read()
+    sheet_packages = split_workbook_by_sheet(workbook_bytes, INPUT_SHEET_NAMES)
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        # Largest sheet first, so it is never the one left waiting for a free worker
+        futures = {
+            sheet_name: executor.submit(_parse_and_clean_sheet, sheet_packages[sheet_name], sheet_name, ocd_col_name)
+            for sheet_name in sorted(INPUT_SHEET_NAMES, key=lambda name: -len(sheet_packages[name]))
+        }
+        # Cleaned frames come back once, already in their final shape, so the
+        # parent process does no further copying.
+        stock_df, po_df, first_lot_df, capacity_status_df = (
+            futures[sheet_name].result() for sheet_name in INPUT_SHEET_NAMES
+        )
+
+    print("Input data read and preprocessed successfully.")
+    return stock_df, po_df, first_lot_df, capacity_status_df
+
+def split_workbook_by_sheet(workbook_bytes, sheet_names):
+    """Splits an XLSX into one small uncompressed XLSX per named sheet.
+
+    The archive is inflated once here. Each package keeps the shared parts (workbook,
+    styles, shared strings) and only its own worksheet XML, stored without compression,
+    so a worker parses one sheet without inflating or scanning the others.
+    Returns a dict of sheet name -> package bytes; a sheet whose part cannot be
+    located gets the whole workbook.
+    """
+    with zipfile.ZipFile(io.BytesIO(workbook_bytes)) as archive:
+        parts = {name: archive.read(name) for name in archive.namelist()}
+    sheet_parts = _worksheet_parts(parts)
+
+    packages = {}
+    for sheet_name in sheet_names:
+        own_part = sheet_parts.get(sheet_name)
+        if own_part is None:
+            packages[sheet_name] = workbook_bytes
+            continue
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as package:
+            for name, data in parts.items():
+                # openpyxl skips sheets whose part is missing from the archive
+                if name in sheet_parts.values() and name != own_part:
+                    continue
+                package.writestr(name, data)
+        packages[sheet_name] = buffer.getvalue()
+    return packages
+
+def _worksheet_parts(parts):
+    """Maps sheet names to their worksheet part paths using xl/workbook.xml and its relationships."""
+    try:
+        workbook = ElementTree.fromstring(parts['xl/workbook.xml'])
+        rels = ElementTree.fromstring(parts['xl/_rels/workbook.xml.rels'])
+    except (KeyError, ElementTree.ParseError):
+        return {}
+    targets = {}
+    for rel in rels:
+        target = rel.get('Target', '')
+        targets[rel.get('Id')] = target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join('xl', target))
+    sheet_parts = {}
+    for sheet in workbook.iter(f'{{{_SPREADSHEET_NS}}}sheet'):
+        target = targets.get(sheet.get(f'{{{_RELATIONSHIP_NS}}}id'))
+        if target in parts:
+            sheet_parts[sheet.get('name')] = target
+    return sheet_parts
 
-    # Data Cleaning and Preparation
-    # Stock Data
-    stock_df['Greige ETA'] = pd.to_datetime(stock_df['Greige ETA'], errors='coerce')
+def _parse_and_clean_sheet(sheet_package, sheet_name, ocd_col_name):
+    """Worker entry point: parses one sheet from its own package and cleans it."""
+    df = pd.read_excel(io.BytesIO(sheet_package), sheet_name=sheet_name)
+    if sheet_name == 'Stock':
+        return _clean_stock_sheet(df)
+    if sheet_name == 'PO':
+        return _clean_po_sheet(df, ocd_col_name)
+    if sheet_name == '1ST LOT STATUS':
+        return _clean_first_lot_sheet(df)
+    return _clean_capacity_sheet(df)
+
+def _clean_stock_sheet(stock_df):
+    """Cleans the Stock sheet."""
+    _normalize_date_columns(stock_df, ['Greige ETA'], 'Stock')
     stock_df['Greige Incoming'] = pd.to_numeric(stock_df['Greige Incoming'], errors='coerce')
     stock_df.dropna(subset=['Greige Code', 'Greige ETA', 'Greige Incoming'], inplace=True)
     stock_df = stock_df[stock_df['Greige Incoming'] > 0]
+    return stock_df
 
-    # PO Data
+def _clean_po_sheet(po_df, ocd_col_name):
+    """Cleans the PO sheet."""
     if 'Mã Vải' in po_df.columns and 'Greige Code' not in po_df.columns:
         po_df.rename(columns={'Mã Vải': 'Greige Code'}, inplace=True)
     elif 'Mã Vải' in po_df.columns and 'Greige Code' in po_df.columns:
@@ -33,9 +239,7 @@ def load_and_prepare_data(input_file, ocd_col_name):
 
     # Convert all date columns to datetime
     date_columns = ['CHD', ocd_col_name]
-    for col in date_columns:
-        if col in po_df.columns:
-            po_df[col] = pd.to_datetime(po_df[col], errors='coerce')
+    _normalize_date_columns(po_df, date_columns, 'PO')
         
     po_df['Quantity request'] = pd.to_numeric(po_df['Quantity request'], errors='coerce')
     po_df['Forecasted'] = po_df['Forecasted'].astype(str).str.lower()
@@ -48,16 +252,18 @@ def load_and_prepare_data(input_file, ocd_col_name):
 
     for col in required_po_cols_check: # Check all, including OCD
         if col not in po_df.columns:
-            if col == ocd_col_name and ocd_col_name not in xls.parse('PO').columns : # Only warn if it was truly missing from file
+            if col == ocd_col_name: # Only the Greige Code column is renamed, so OCD was truly missing from file
                  pass # Already handled and warned about OCD_COL_NAME
             else:
                 print(f"Warning: Column '{col}' not found in PO sheet. Adding it as NA.")
                 po_df[col] = pd.NA
 
     po_df.dropna(subset=['PO', 'Greige Code', 'CHD', 'Quantity request'], inplace=True)
+    return po_df
 
-    # 1st Lot Status Data
-    first_lot_df['DUE DATE'] = pd.to_datetime(first_lot_df['DUE DATE'], errors='coerce')
+def _clean_first_lot_sheet(first_lot_df):
+    """Cleans the 1ST LOT STATUS sheet."""
+    _normalize_date_columns(first_lot_df, ['DUE DATE'], '1ST LOT STATUS')
     
     # Handle both old and new column names
     column_mapping = {
@@ -90,20 +296,15 @@ def load_and_prepare_data(input_file, ocd_col_name):
         first_lot_df['STATUS'] = first_lot_df['STATUS'].astype(str).str.strip().str.upper()
     
     first_lot_df.dropna(subset=['Greige Code', 'COLOR', 'STATUS'], inplace=True)
+    return first_lot_df
 
-    # Print debug information after cleaning
-    print("\nDebug: First few rows of first_lot_df after cleaning:")
-    print(first_lot_df.head())
-    print("\nDebug: Number of rows in first_lot_df after cleaning:", len(first_lot_df))
-
-    # Capacity Status Data
-    capacity_status_df['CAPACITY DATE'] = pd.to_datetime(capacity_status_df['CAPACITY DATE'], errors='coerce')
+def _clean_capacity_sheet(capacity_status_df):
+    """Cleans the Capacity Status sheet."""
+    _normalize_date_columns(capacity_status_df, ['CAPACITY DATE'], 'Capacity Status')
     capacity_status_df['CAPACITY REMAIN'] = pd.to_numeric(capacity_status_df['CAPACITY REMAIN'], errors='coerce')
     capacity_status_df.dropna(subset=['CAPACITY DATE', 'CAPACITY REMAIN'], inplace=True)
     capacity_status_df = capacity_status_df.sort_values(by='CAPACITY DATE')
-    
-    print("Input data read and preprocessed successfully.")
-    return stock_df, po_df, first_lot_df, capacity_status_df
+    return capacity_status_df
 
 def read_input_data(file_path):
     """Reads and preprocesses input data from Excel file."""
@@ -0,0 +1,65 @@
+import pandas as pd
+
+# --- Day-ordinal dates ---
+# Steps 1-3 work on dates as int32 day ordinals (days since 1970-01-01) instead of
+# pandas Timestamps, so comparisons and lead-time arithmetic in their loops are plain
+# integer operations. "No date" (unscheduled, insufficient stock/capacity) is a null
+# (pd.NA in columns, None in scalars) instead of the FAR_FUTURE_DATE sentinel.
+# Dates are converted once after loading and converted back only when writing output.
+
+ORDINAL_EPOCH = pd.Timestamp('1970-01-01')
+ORDINAL_DTYPE = 'Int32'
+
+def to_day_ordinals(values, far_future_date=None):
+    """Converts date-like values (a Series) to nullable int32 day ordinals.
+
+    Unparseable values and, if given, the far_future_date sentinel become null.
+    """
+    dates = pd.to_datetime(values, errors='coerce')
+    if far_future_date is not None:
+        dates = dates.mask(dates == far_future_date)
+    days = (dates.dt.normalize() - ORDINAL_EPOCH).dt.days
+    return days.astype(ORDINAL_DTYPE)
+
+def from_day_ordinals(ordinals):
+    """Converts a Series of day ordinals (nulls allowed) back to datetime64 values (NaT for nulls)."""
+    days = pd.to_numeric(ordinals, errors='coerce').astype('float64')
+    return ORDINAL_EPOCH + pd.to_timedelta(days, unit='D')
+
+def date_to_day_ordinal(date_value):
+    """Converts one date-like value to a day ordinal (int), or None if it is missing."""
+    if date_value is None or pd.isna(date_value):
+        return None
+    return (pd.Timestamp(date_value).normalize() - ORDINAL_EPOCH).days
+
+def day_ordinal_to_date(ordinal):
+    """Converts one day ordinal back to a Timestamp, or NaT if it is null."""
+    if ordinal is None or pd.isna(ordinal):
+        return pd.NaT
+    return ORDINAL_EPOCH + pd.Timedelta(days=int(ordinal))
+
+def format_day_ordinals(ordinals, missing_str):
+    """Formats day ordinals as YYYY-MM-DD strings for output, using missing_str for nulls."""
+    dates = from_day_ordinals(ordinals)
+    return dates.dt.strftime('%Y-%m-%d').astype(object).where(dates.notna(), missing_str)
+
+def convert_planning_dates_to_ordinals(stock_df, po_df, first_lot_df, capacity_status_df, ocd_col_name, far_future_date):
+    """Returns the loaded sheets with every planning date column converted to day ordinals.
+
+    A far_future_date sentinel already present in the PO or 1ST LOT STATUS dates becomes null.
+    A sentinel DUE DATE means the lot will never be ready rather than that the date is
+    missing, so it is also flagged in an Is_Due_Date_Never column for Step 2.
+    Stock ETAs and capacity dates are kept as real dates, since those rows need one.
+    """
+    def convert(df, cols, sentinel):
+        return df.assign(**{col: to_day_ordinals(df[col], sentinel) for col in cols if col in df.columns})
+
+    stock_df = convert(stock_df, ['Greige ETA'], None)
+    po_df = convert(po_df, ['CHD', ocd_col_name], far_future_date)
+    if 'DUE DATE' in first_lot_df.columns:
+        first_lot_df = first_lot_df.assign(
+            Is_Due_Date_Never=(pd.to_datetime(first_lot_df['DUE DATE'], errors='coerce') == far_future_date).to_numpy()
+        )
+    first_lot_df = convert(first_lot_df, ['DUE DATE'], far_future_date)
+    capacity_status_df = convert(capacity_status_df, ['CAPACITY DATE'], None)
+    return stock_df, po_df, first_lot_df, capacity_status_df
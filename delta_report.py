@@ -0,0 +1,138 @@
+import os
+import pandas as pd
+from day_ordinals import ORDINAL_DTYPE, to_day_ordinals, from_day_ordinals, format_day_ordinals
+from step1_draft_etd import PO_ROW_COL
+
+# Columns that identify a PO line across runs. A PO can carry several lines for the
+# same Greige Code/COLOR, so a running line number is added to make the key unique.
+SNAPSHOT_KEY_COLS = ['PO', 'Greige Code', 'ITEM', 'COLOR', 'LINE NO']
+
+# Result columns compared between runs: the three ETDs and the batch split.
+# Dates are kept as day ordinals (null = not scheduled), as produced by Steps 1-3.
+SNAPSHOT_DATE_COLS = ['Draft ETD', '2nd ETD', 'FINAL ETD', 'DATE 1ST BATCH', 'DATE 2ND BATCH']
+SNAPSHOT_QTY_COLS = ['DEVIDED QUANTITY 1ST', 'DEVIDED QUANTITY 2ND']
+SNAPSHOT_VALUE_COLS = SNAPSHOT_DATE_COLS + SNAPSHOT_QTY_COLS
+
+def build_result_snapshot(final_etd_df):
+    """Builds a compact, keyed snapshot of a run's ETD results from the Step 3 output."""
+    snapshot_df = pd.DataFrame(index=final_etd_df.index)
+    for col in ['PO', 'Greige Code', 'ITEM', 'COLOR']:
+        if col in final_etd_df.columns:
+            snapshot_df[col] = final_etd_df[col].astype(str).str.strip()
+        else:
+            snapshot_df[col] = ''
+
+    for col in SNAPSHOT_DATE_COLS:
+        if col in final_etd_df.columns:
+            snapshot_df[col] = final_etd_df[col].astype(ORDINAL_DTYPE)
+        else:
+            snapshot_df[col] = pd.array([pd.NA] * len(final_etd_df), dtype=ORDINAL_DTYPE)
+
+    for col in SNAPSHOT_QTY_COLS:
+        values = final_etd_df[col] if col in final_etd_df.columns else pd.Series(pd.NA, index=final_etd_df.index)
+        snapshot_df[col] = pd.to_numeric(values, errors='coerce').astype('Float64')
+
+    # Number repeated keys by their order in the PO sheet, so a line keeps its key when only
+    # its values change (sorting by a value column would renumber the lines around it)
+    if PO_ROW_COL in final_etd_df.columns:
+        snapshot_df['_SOURCE ROW'] = final_etd_df[PO_ROW_COL].values
+    else:
+        snapshot_df['_SOURCE ROW'] = range(len(final_etd_df))
+    snapshot_df = snapshot_df.sort_values(by=['PO', 'Greige Code', 'ITEM', 'COLOR', '_SOURCE ROW'], kind='stable')
+    snapshot_df['LINE NO'] = snapshot_df.groupby(['PO', 'Greige Code', 'ITEM', 'COLOR']).cumcount()
+    snapshot_df = snapshot_df.drop(columns=['_SOURCE ROW'])
+
+    return snapshot_df[SNAPSHOT_KEY_COLS + SNAPSHOT_VALUE_COLS].reset_index(drop=True)
+
+def save_result_snapshot(snapshot_df, snapshot_file):
+    """Saves a result snapshot as Parquet (.parquet) or CSV (any other extension)."""
+    print(f"Saving result snapshot to {snapshot_file}...")
+    if _is_parquet(snapshot_file):
+        snapshot_df.to_parquet(snapshot_file, index=False)
+    else:
+        _with_dates(snapshot_df, SNAPSHOT_DATE_COLS).to_csv(snapshot_file, index=False, date_format='%Y-%m-%d')
+
+def load_result_snapshot(snapshot_file):
+    """Loads a snapshot written by save_result_snapshot, restoring its column types."""
+    if _is_parquet(snapshot_file):
+        snapshot_df = pd.read_parquet(snapshot_file)
+    else:
+        snapshot_df = pd.read_csv(snapshot_file, dtype={col: str for col in SNAPSHOT_KEY_COLS[:-1]},
+                                  keep_default_na=False, na_values=[''])
+    for col in SNAPSHOT_KEY_COLS[:-1]:
+        snapshot_df[col] = snapshot_df[col].fillna('').astype(str)
+    snapshot_df['LINE NO'] = snapshot_df['LINE NO'].astype('int64')
+    for col in SNAPSHOT_DATE_COLS:
+        if pd.api.types.is_integer_dtype(snapshot_df[col]):
+            snapshot_df[col] = snapshot_df[col].astype(ORDINAL_DTYPE)
+        else:
+            snapshot_df[col] = to_day_ordinals(snapshot_df[col])
+    for col in SNAPSHOT_QTY_COLS:
+        snapshot_df[col] = pd.to_numeric(snapshot_df[col], errors='coerce').astype('Float64')
+    return snapshot_df
+
+def compute_etd_delta(previous_snapshot_df, current_snapshot_df):
+    """Returns only the PO lines whose Draft/2nd/Final ETD or batch split changed between two snapshots.
+
+    Each side is reduced to its key columns plus a 64-bit hash of the result columns,
+    the two are hash-joined on the key, and full values are only pulled in for lines
+    whose hash differs (or which appear on one side only).
+    """
+    print("Computing ETD delta against the previous run...")
+    previous_hashed = _with_row_hash(previous_snapshot_df)
+    current_hashed = _with_row_hash(current_snapshot_df)
+
+    joined = pd.merge(
+        previous_hashed[SNAPSHOT_KEY_COLS + ['ROW HASH']],
+        current_hashed[SNAPSHOT_KEY_COLS + ['ROW HASH']],
+        on=SNAPSHOT_KEY_COLS,
+        how='outer',
+        suffixes=(' (PREVIOUS)', ' (CURRENT)'),
+        indicator=True
+    )
+    changed_mask = (joined['_merge'] != 'both') | (joined['ROW HASH (PREVIOUS)'] != joined['ROW HASH (CURRENT)'])
+    changed_keys = joined.loc[changed_mask, SNAPSHOT_KEY_COLS + ['_merge']]
+
+    change_type = changed_keys['_merge'].map({'left_only': 'REMOVED', 'right_only': 'NEW', 'both': 'CHANGED'})
+    delta_df = changed_keys[SNAPSHOT_KEY_COLS].assign(**{'CHANGE': change_type.astype(str).values})
+    delta_df = delta_df.merge(previous_snapshot_df, on=SNAPSHOT_KEY_COLS, how='left')
+    delta_df = delta_df.merge(current_snapshot_df, on=SNAPSHOT_KEY_COLS, how='left',
+                              suffixes=(' (PREVIOUS)', ' (CURRENT)'))
+
+    ordered_cols = SNAPSHOT_KEY_COLS + ['CHANGE']
+    for col in SNAPSHOT_VALUE_COLS:
+        ordered_cols += [f'{col} (PREVIOUS)', f'{col} (CURRENT)']
+    delta_df = delta_df[ordered_cols].sort_values(by=SNAPSHOT_KEY_COLS).reset_index(drop=True)
+
+    print(f"ETD delta: {len(delta_df)} changed PO lines out of {len(current_snapshot_df)}.")
+    return delta_df
+
+def write_delta_report(delta_df, delta_file):
+    """Writes the delta report to a standalone Parquet (.parquet) or CSV file."""
+    print(f"Writing ETD delta report to {delta_file}...")
+    delta_date_cols = [col + side for col in SNAPSHOT_DATE_COLS for side in (' (PREVIOUS)', ' (CURRENT)')]
+    delta_df = _with_dates(delta_df, delta_date_cols)
+    if _is_parquet(delta_file):
+        delta_df.to_parquet(delta_file, index=False)
+    else:
+        delta_df.to_csv(delta_file, index=False, date_format='%Y-%m-%d')
+
+def format_delta_for_excel(delta_df):
+    """Formats a delta report for the ETD DELTA sheet of the output workbook."""
+    df_to_write = delta_df.copy()
+    for col in SNAPSHOT_DATE_COLS:
+        for side in (' (PREVIOUS)', ' (CURRENT)'):
+            df_to_write[col + side] = format_day_ordinals(df_to_write[col + side], '')
+    return df_to_write
+
+def _with_row_hash(snapshot_df):
+    hashed = snapshot_df.copy()
+    hashed['ROW HASH'] = pd.util.hash_pandas_object(snapshot_df[SNAPSHOT_VALUE_COLS], index=False).values
+    return hashed
+
+def _with_dates(df, date_cols):
+    # Day ordinals are converted back to dates only in files people read
+    return df.assign(**{col: from_day_ordinals(df[col]) for col in date_cols})
+
+def _is_parquet(path):
+    return os.path.splitext(str(path))[1].lower() in ('.parquet', '.pq')
@@ -0,0 +1,368 @@
+"""Local load test for the upload web app (app.py).
+
+Starts the app on a free local port, uploads synthetic workbooks at a fixed
+concurrency and reports latency percentiles, throughput, error rate and the peak
+memory of the server and of each po_processor worker it spawns. Runs fully
+offline; workbooks are generated from a fixed seed so runs are repeatable. The app
+runs against temporary upload/output folders, never the live ones. The server's
+output goes to server.log in that temporary folder, which is kept when a run fails.
+
+Example:
+    python3 load_test.py --rows 500 --concurrency 4 --requests 40
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import config
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# --- Synthetic input ---
+def generate_synthetic_workbook(path, po_rows, seed=0, greige_codes=50, capacity_days=365):
+    """Writes a workbook with the four input sheets and po_rows PO lines, deterministic for a given seed."""
+    rng = random.Random(seed)
+    today = pd.Timestamp(config.TODAY_DATE).normalize()
+    codes = [f"G{i:04d}" for i in range(greige_codes)]
+    colors = ['WHITE', 'BLACK', 'NAVY', 'RED', 'GREY']
+    stock_rows = max(greige_codes, po_rows // 2)
+
+    def choices(values, count):
+        return rng.choices(values, k=count)
+
+    def integers(low, high, count):
+        # Half-open range [low, high)
+        return [rng.randrange(low, high) for _ in range(count)]
+
+    stock_df = pd.DataFrame({
+        'Greige Code': choices(codes, stock_rows),
+        'Greige ETA': today + pd.to_timedelta(integers(-30, 90, stock_rows), unit='D'),
+        'Greige Incoming': integers(200, 5000, stock_rows),
+    })
+    po_df = pd.DataFrame({
+        'SPL': 'SPL', 'FG name': 'FG', 'Season': 'SS', 'Local/ Export': 'Export',
+        'PO': [f"PO{i:06d}" for i in range(po_rows)],
+        config.OCD_COL_NAME: today - pd.to_timedelta(integers(0, 30, po_rows), unit='D'),
+        'CHD': today + pd.to_timedelta(integers(30, 180, po_rows), unit='D'),
+        'Greige Code': choices(codes, po_rows),
+        'Greige Name': 'Greige',
+        'ITEM': 'ITEM',
+        'COLOR': choices(colors, po_rows),
+        'Quantity request': integers(100, 4000, po_rows),
+        'Forecasted': choices(['yes', 'no'], po_rows),
+    })
+    first_lot_df = pd.DataFrame({
+        'Greige Code': codes,
+        'COLOR': choices(colors, greige_codes),
+        'STATUS': choices(['OK', 'EXPIRED'], greige_codes),
+        'DUE DATE': today + pd.to_timedelta(integers(0, 120, greige_codes), unit='D'),
+    })
+    capacity_status_df = pd.DataFrame({
+        'CAPACITY DATE': pd.date_range(today, periods=capacity_days, freq='D'),
+        'CAPACITY REMAIN': integers(-1000, 8000, capacity_days),
+    })
+
+    with pd.ExcelWriter(path, engine='openpyxl') as writer:
+        stock_df.to_excel(writer, sheet_name='Stock', index=False)
+        po_df.to_excel(writer, sheet_name='PO', index=False)
+        first_lot_df.to_excel(writer, sheet_name='1ST LOT STATUS', index=False)
+        capacity_status_df.to_excel(writer, sheet_name='Capacity Status', index=False)
+
+# --- Server management ---
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_server(port, server='flask', workers=1, in_memory_output=False, data_dir=None, log_path=None):
+    """Starts app.py on 127.0.0.1:port and waits until it accepts connections.
+
+    With ``data_dir`` set, the app keeps its uploads, outputs and planning state there.
+    The server's stdout and stderr go to ``log_path`` (discarded if it is None).
+    """
+    if server == 'gunicorn':
+        cmd = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}',
+               '--workers', str(workers), '--timeout', '600', 'app:app']
+    else:
+        # Threaded development server, without the debug reloader
+        cmd = [sys.executable, '-c',
+               f"from app import app; app.run(host='127.0.0.1', port={port}, debug=False, threaded=True)"]
+    env = dict(os.environ, IN_MEMORY_OUTPUT='1' if in_memory_output else '0')
+    if data_dir:
+        # Keep the run away from the live upload/output folders and ATP planning state
+        env.update(
+            UPLOAD_FOLDER=os.path.join(data_dir, 'uploads'),
+            OUTPUT_FOLDER=os.path.join(data_dir, 'outputs'),
+            PLANNING_STATE_FILE=os.path.join(data_dir, 'outputs', 'planning_state.pkl'),
+        )
+    log_file = open(log_path, 'ab') if log_path else subprocess.DEVNULL
+    try:
+        process = subprocess.Popen(cmd, cwd=PROJECT_ROOT, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+    finally:
+        if log_path:
+            log_file.close() # The child keeps its own copy of the descriptor
+    log_hint = f" See {log_path}." if log_path else ""
+
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited during startup with code {process.returncode}.{log_hint}")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f"Server did not start within 30 seconds.{log_hint}")
+
+# --- Memory sampling ---
+class ProcessTreeMemorySampler:
+    """Samples the peak RSS (VmHWM) of a process and all its descendants from /proc (Linux only)."""
+
+    def __init__(self, root_pid, interval=0.05):
+        self.root_pid = root_pid
+        self.interval = interval
+        self.peak_kb_by_pid = {}
+        self.cmdline_by_pid = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self.available = os.path.exists(f'/proc/{root_pid}/status')
+
+    def start(self):
+        if self.available:
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self.available:
+            self._thread.join()
+
+    def _descendants(self):
+        children = {}
+        for entry in os.listdir('/proc'):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    # The command name may contain spaces; fields resume after the last ')'
+                    ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+        pids, stack = [], [self.root_pid]
+        while stack:
+            pid = stack.pop()
+            pids.append(pid)
+            stack.extend(children.get(pid, []))
+        return pids
+
+    def _run(self):
+        while not self._stop.is_set():
+            for pid in self._descendants():
+                try:
+                    with open(f'/proc/{pid}/status') as f:
+                        for line in f:
+                            if line.startswith('VmHWM:'):
+                                peak_kb = int(line.split()[1])
+                                self.peak_kb_by_pid[pid] = max(peak_kb, self.peak_kb_by_pid.get(pid, 0))
+                                break
+                    if pid not in self.cmdline_by_pid:
+                        with open(f'/proc/{pid}/cmdline', 'rb') as f:
+                            self.cmdline_by_pid[pid] = f.read().replace(b'\0', b' ').decode(errors='replace')
+                except OSError:
+                    continue # Process exited between listing and reading
+            self._stop.wait(self.interval)
+
+    def summary(self):
+        server_kb = [kb for pid, kb in self.peak_kb_by_pid.items()
+                     if 'po_processor.py' not in self.cmdline_by_pid.get(pid, '')]
+        worker_kb = [kb for pid, kb in self.peak_kb_by_pid.items()
+                     if 'po_processor.py' in self.cmdline_by_pid.get(pid, '')]
+        return {
+            'server_peak_rss_mb': round(max(server_kb) / 1024, 1) if server_kb else None,
+            'worker_count_sampled': len(worker_kb),
+            'worker_peak_rss_mb_max': round(max(worker_kb) / 1024, 1) if worker_kb else None,
+            'worker_peak_rss_mb_mean': round(sum(worker_kb) / len(worker_kb) / 1024, 1) if worker_kb else None,
+        }
+
+# --- Requests ---
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+_opener = urllib.request.build_opener(_NoRedirect)
+
+def upload_workbook(base_url, workbook_bytes, filename, download=False, timeout=600):
+    """Uploads one workbook; returns (ok, latency_seconds, detail)."""
+    boundary = uuid.uuid4().hex
+    body = (
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        'Content-Type: application/vnd.openxmlformats-officedocument.spreadsheetml.sheet\r\n\r\n'
+    ).encode() + workbook_bytes + f'\r\n--{boundary}--\r\n'.encode()
+    request = urllib.request.Request(base_url + '/', data=body, method='POST',
+                                     headers={'Content-Type': f'multipart/form-data; boundary={boundary}'})
+    start = time.perf_counter()
+    try:
+        try:
+            response = _opener.open(request, timeout=timeout)
+            status, location = response.status, response.headers.get('Location', '')
+            attachment = 'attachment' in response.headers.get('Content-Disposition', '')
+            job_id = response.headers.get('X-Job-Id', '')
+            response.read()
+        except urllib.error.HTTPError as e:
+            status, location, attachment, job_id = e.code, e.headers.get('Location', ''), False, ''
+            e.read()
+
+        # Success redirects to the download, or returns the workbook itself with in-memory output;
+        # failures redirect back to the form with a flash message
+        if status == 200 and attachment:
+            return bool(job_id), time.perf_counter() - start, f'HTTP 200 (workbook in response, job {job_id or "?"})'
+        ok = status in (301, 302, 303, 307, 308) and '/outputs/' in location
+        if ok and download:
+            with urllib.request.urlopen(urllib.parse.urljoin(base_url, location), timeout=timeout) as download_response:
+                download_response.read()
+        return ok, time.perf_counter() - start, f'HTTP {status} -> {location}'
+    except Exception as e:
+        return False, time.perf_counter() - start, f'{type(e).__name__}: {e}'
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(pct / 100 * len(sorted_values) + 0.5 - 1e-9)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def run_load_test(rows, concurrency, requests, warmup=1, seed=0, server='flask', workers=1, download=False,
+                  in_memory_output=False):
+    """Runs one load test and returns a results dict.
+
+    The server gets its own temporary folders, so a run never touches live uploads,
+    outputs or the ATP planning state on the host. They are removed afterwards unless
+    a request failed (or the server did not start), so its log can be inspected.
+    """
+    data_dir = tempfile.mkdtemp(prefix='po_load_test_')
+    log_path = os.path.join(data_dir, 'server.log')
+    keep_data_dir = True
+    try:
+        workbook_path = os.path.join(data_dir, 'load_test_input.xlsx')
+        generate_synthetic_workbook(workbook_path, rows, seed=seed)
+        with open(workbook_path, 'rb') as f:
+            workbook_bytes = f.read()
+
+        port = _free_port()
+        base_url = f'http://127.0.0.1:{port}'
+        process = start_server(port, server=server, workers=workers, in_memory_output=in_memory_output,
+                               data_dir=data_dir, log_path=log_path)
+        sampler = ProcessTreeMemorySampler(process.pid)
+        try:
+            for _ in range(warmup):
+                upload_workbook(base_url, workbook_bytes, 'PO - Request.xlsx', download=download)
+
+            sampler.start()
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                results = list(executor.map(
+                    lambda _: upload_workbook(base_url, workbook_bytes, 'PO - Request.xlsx', download=download),
+                    range(requests)
+                ))
+            elapsed = time.perf_counter() - started
+            sampler.stop()
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        keep_data_dir = not results or not all(ok for ok, _, _ in results)
+    finally:
+        if keep_data_dir:
+            print(f"Server log kept at {log_path}", file=sys.stderr)
+        else:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    latencies = sorted(latency for ok, latency, _ in results if ok)
+    errors = [detail for ok, _, detail in results if not ok]
+    return {
+        'rows': rows,
+        'workbook_bytes': len(workbook_bytes),
+        'concurrency': concurrency,
+        'requests': requests,
+        'server': server,
+        'server_workers': workers if server == 'gunicorn' else None,
+        'in_memory_output': in_memory_output,
+        'elapsed_seconds': round(elapsed, 3),
+        'throughput_rps': round(len(results) / elapsed, 3) if elapsed else None,
+        'error_rate': round(len(errors) / len(results), 4) if results else None,
+        'latency_p50_seconds': percentile(latencies, 50),
+        'latency_p95_seconds': percentile(latencies, 95),
+        'latency_p99_seconds': percentile(latencies, 99),
+        'memory': sampler.summary() if sampler.available else None,
+        'sample_errors': errors[:5],
+        'server_log': log_path if keep_data_dir else None,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the PO upload app locally.")
+    parser.add_argument('--rows', type=int, default=200, help="PO lines per synthetic workbook")
+    parser.add_argument('--concurrency', type=int, default=4, help="simultaneous uploads")
+    parser.add_argument('--requests', type=int, default=20, help="measured uploads")
+    parser.add_argument('--warmup', type=int, default=1, help="unmeasured uploads before the run")
+    parser.add_argument('--seed', type=int, default=0, help="seed for the synthetic workbook")
+    parser.add_argument('--server', choices=['flask', 'gunicorn'], default='flask')
+    parser.add_argument('--workers', type=int, default=1, help="gunicorn worker processes")
+    parser.add_argument('--download', action='store_true', help="also download each output file")
+    parser.add_argument('--in-memory-output', action='store_true',
+                        help="run the app with IN_MEMORY_OUTPUT=1 (workbook returned in the upload response)")
+    parser.add_argument('--json', dest='json_path', help="write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = run_load_test(args.rows, args.concurrency, args.requests, warmup=args.warmup, seed=args.seed,
+                            server=args.server, workers=args.workers, download=args.download,
+                            in_memory_output=args.in_memory_output)
+
+    def fmt(seconds):
+        return f"{seconds * 1000:.0f} ms" if seconds is not None else "n/a"
+
+    print(f"Rows per workbook: {results['rows']} ({results['workbook_bytes'] / 1024:.0f} KB)")
+    print(f"Concurrency: {results['concurrency']}, requests: {results['requests']}, server: {results['server']}")
+    print(f"Throughput: {results['throughput_rps']} req/s over {results['elapsed_seconds']} s")
+    error_rate = results['error_rate']
+    print(f"Error rate: {error_rate:.1%}" if error_rate is not None else "Error rate: n/a (no requests completed)")
+    print(f"Latency p50/p95/p99: {fmt(results['latency_p50_seconds'])} / "
+          f"{fmt(results['latency_p95_seconds'])} / {fmt(results['latency_p99_seconds'])}")
+    if results['memory']:
+        memory = results['memory']
+        print(f"Peak RSS: server {memory['server_peak_rss_mb']} MB, "
+              f"po_processor workers max {memory['worker_peak_rss_mb_max']} MB / "
+              f"mean {memory['worker_peak_rss_mb_mean']} MB ({memory['worker_count_sampled']} sampled)")
+    else:
+        print("Peak RSS: not available on this platform")
+    for detail in results['sample_errors']:
+        print(f"  error: {detail}")
+    if results['server_log']:
+        print(f"Server log: {results['server_log']}")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+    # No completed requests (error rate None) is a failure too
+    return 0 if error_rate == 0 else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,237 @@
+import hashlib
+import os
+import pickle
+import shutil
+import time
+from collections import namedtuple
+from contextlib import nullcontext
+import pandas as pd
+
+# --- Stage DAG ---
+# The pipeline is a list of stages, each declaring the artifacts it reads and writes.
+# A stage's cache key is a fingerprint of its name, its parameters and the fingerprints
+# of its inputs, so a stage only re-runs when something it actually depends on changed.
+# Outputs are materialized under cache_dir/<stage>/<key>/, which lets a failed run resume
+# from the last good stage. DataFrames are stored as Parquet (pyarrow is a requirement);
+# other artifacts (the stock state and capacity dicts) and frames Parquet cannot represent
+# are pickled, so the cache directory must only be writable by the pipeline itself.
+# The cache is kept under a size and age cap, evicting the least recently used entries.
+
+# Bump when a stage's logic changes so results cached by older code are not reused.
+PIPELINE_CACHE_VERSION = 5
+
+# name: stage name; inputs/outputs: artifact names; params: values the result depends on;
+# run: callable taking the input artifacts and returning a tuple of outputs;
+# content_fingerprint: fingerprint outputs by content instead of by cache key, so an
+# unchanged output (e.g. an untouched sheet) keeps downstream stages cached.
+Stage = namedtuple('Stage', ['name', 'inputs', 'outputs', 'params', 'run', 'content_fingerprint'])
+
+_COMPLETE_MARKER = '_COMPLETE'
+
+def make_stage(name, inputs, outputs, run, params=None, content_fingerprint=False):
+    """Convenience constructor for Stage with optional params and content fingerprinting."""
+    return Stage(name, list(inputs), list(outputs), dict(params or {}), run, content_fingerprint)
+
+def fingerprint_file(path):
+    """Returns a SHA-256 fingerprint of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def fingerprint_value(value):
+    """Returns a SHA-256 fingerprint of a DataFrame's contents (or of any picklable value)."""
+    digest = hashlib.sha256()
+    if isinstance(value, pd.DataFrame):
+        digest.update(repr(list(value.columns)).encode())
+        digest.update(repr([str(dtype) for dtype in value.dtypes]).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+    else:
+        digest.update(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    return digest.hexdigest()
+
+def downstream_stages(stages, stage_names):
+    """Returns the given stages plus every stage that depends on them, directly or indirectly."""
+    selected = set(stage_names)
+    produced = set()
+    for stage in stages:
+        if stage.name in selected or produced.intersection(stage.inputs):
+            selected.add(stage.name)
+            produced.update(stage.outputs)
+    return selected
+
+def run_stages(stages, sources, cache_dir=None, rerun_from=None, stage_scope=None,
+               cache_max_bytes=None, cache_max_age_seconds=None):
+    """Runs stages in declaration order and returns a dict of every artifact.
+
+    ``sources`` maps each external artifact name to a (value, fingerprint) pair.
+    With ``cache_dir`` set, a stage whose cache key is already materialized is loaded
+    instead of run, and afterwards the cache is pruned to ``cache_max_bytes`` and
+    ``cache_max_age_seconds`` (see prune_stage_cache), keeping the entries of this run.
+    ``rerun_from`` (a stage name or list of names) forces those stages
+    and everything downstream of them to run again. ``stage_scope``, if given, is called
+    with each stage's name and must return a context manager to run (or load) it in,
+    e.g. RunProfiler.stage from profiling.py.
+    """
+    artifacts = {name: value for name, (value, _) in sources.items()}
+    fingerprints = {name: fingerprint for name, (_, fingerprint) in sources.items()}
+
+    if isinstance(rerun_from, str):
+        rerun_from = [rerun_from]
+    unknown = set(rerun_from or []) - {stage.name for stage in stages}
+    if unknown:
+        raise ValueError(f"Unknown stage(s) in rerun_from: {', '.join(sorted(unknown))}")
+    forced = downstream_stages(stages, rerun_from or [])
+    used_stage_dirs = []
+
+    for stage in stages:
+        missing = [name for name in stage.inputs if name not in artifacts]
+        if missing:
+            raise ValueError(f"Stage '{stage.name}' is missing input(s): {', '.join(missing)}")
+
+        cache_key = _stage_cache_key(stage, [fingerprints[name] for name in stage.inputs])
+        stage_dir = os.path.join(cache_dir, stage.name, cache_key) if cache_dir else None
+        if stage_dir:
+            used_stage_dirs.append(stage_dir)
+
+        with stage_scope(stage.name) if stage_scope else nullcontext():
+            outputs = None
+            if stage_dir and stage.name not in forced:
+                outputs = _load_stage_outputs(stage, stage_dir)
+                if outputs is not None:
+                    print(f"Stage '{stage.name}': reusing cached outputs ({cache_key[:12]}).")
+
+            if outputs is None:
+                outputs = stage.run(*[artifacts[name] for name in stage.inputs])
+                if not isinstance(outputs, tuple):
+                    outputs = (outputs,)
+                if len(outputs) != len(stage.outputs):
+                    raise ValueError(f"Stage '{stage.name}' returned {len(outputs)} outputs, expected {len(stage.outputs)}.")
+                if stage_dir:
+                    _save_stage_outputs(stage, stage_dir, outputs)
+
+        for name, value in zip(stage.outputs, outputs):
+            artifacts[name] = value
+            if stage.content_fingerprint:
+                fingerprints[name] = fingerprint_value(value)
+            else:
+                fingerprints[name] = hashlib.sha256(f"{cache_key}:{name}".encode()).hexdigest()
+
+    if cache_dir and (cache_max_bytes is not None or cache_max_age_seconds is not None):
+        prune_stage_cache(cache_dir, cache_max_bytes, cache_max_age_seconds, keep=used_stage_dirs)
+    return artifacts
+
+def prune_stage_cache(cache_dir, max_bytes=None, max_age_seconds=None, keep=()):
+    """Removes cache entries unused for ``max_age_seconds``, then the least recently used
+    ones until the cache fits in ``max_bytes``. Entries in ``keep`` are never removed.
+
+    Leftover scratch directories of interrupted writes are entries too. Returns a dict
+    with the number of entries and bytes removed.
+    """
+    kept = {os.path.abspath(path) for path in keep}
+    entries = []
+    for stage_name in _list_dirs(cache_dir):
+        for entry_name in _list_dirs(os.path.join(cache_dir, stage_name)):
+            entry_dir = os.path.abspath(os.path.join(cache_dir, stage_name, entry_name))
+            size, last_used = _entry_usage(entry_dir)
+            entries.append((last_used, size, entry_dir))
+
+    now = time.time()
+    total_bytes = sum(size for _, size, _ in entries)
+    removed_entries, removed_bytes = 0, 0
+    for last_used, size, entry_dir in sorted(entries): # Least recently used first
+        if entry_dir in kept:
+            continue
+        expired = max_age_seconds is not None and now - last_used > max_age_seconds
+        if not expired and (max_bytes is None or total_bytes <= max_bytes):
+            continue
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        total_bytes -= size
+        removed_entries += 1
+        removed_bytes += size
+
+    if removed_entries:
+        print(f"Stage cache: removed {removed_entries} entries ({removed_bytes} bytes), {total_bytes} bytes kept.")
+    return {'removed_entries': removed_entries, 'removed_bytes': removed_bytes, 'total_bytes_after': total_bytes}
+
+def _list_dirs(path):
+    try:
+        return [entry.name for entry in os.scandir(path) if entry.is_dir(follow_symlinks=False)]
+    except FileNotFoundError:
+        return []
+
+def _entry_usage(entry_dir):
+    # An entry is "used" when it is written or loaded; loading touches its marker file
+    size = 0
+    last_used = 0.0
+    for root, _, files in os.walk(entry_dir):
+        for name in files:
+            try:
+                stat = os.stat(os.path.join(root, name))
+            except FileNotFoundError:
+                continue
+            size += stat.st_size
+            last_used = max(last_used, stat.st_mtime)
+    if last_used == 0.0:
+        try:
+            last_used = os.stat(entry_dir).st_mtime
+        except FileNotFoundError:
+            pass
+    return size, last_used
+
+def _stage_cache_key(stage, input_fingerprints):
+    digest = hashlib.sha256()
+    digest.update(f"v{PIPELINE_CACHE_VERSION}:{stage.name}".encode())
+    for key in sorted(stage.params):
+        digest.update(f"{key}={stage.params[key]!r}".encode())
+    for name, fingerprint in zip(stage.inputs, input_fingerprints):
+        digest.update(f"{name}={fingerprint}".encode())
+    return digest.hexdigest()
+
+def _save_stage_outputs(stage, stage_dir, outputs):
+    # Write into a scratch directory and rename it into place, so a crash mid-write
+    # never leaves a partial entry that a later run would pick up.
+    tmp_dir = f"{stage_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    for name, value in zip(stage.outputs, outputs):
+        base_path = os.path.join(tmp_dir, name)
+        if isinstance(value, pd.DataFrame):
+            try:
+                value.to_parquet(base_path + '.parquet')
+                continue
+            except (ValueError, TypeError, NotImplementedError) as e:
+                # pyarrow errors derive from these; e.g. a column mixing numbers and text
+                print(f"Stage '{stage.name}': {name} cannot be stored as Parquet ({e}); caching it as pickle.")
+                if os.path.exists(base_path + '.parquet'):
+                    os.remove(base_path + '.parquet')
+        with open(base_path + '.pkl', 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+    open(os.path.join(tmp_dir, _COMPLETE_MARKER), 'w').close()
+
+    if os.path.exists(stage_dir):
+        shutil.rmtree(tmp_dir, ignore_errors=True) # Another run materialized it first
+        return
+    os.makedirs(os.path.dirname(stage_dir), exist_ok=True)
+    try:
+        os.rename(tmp_dir, stage_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def _load_stage_outputs(stage, stage_dir):
+    marker = os.path.join(stage_dir, _COMPLETE_MARKER)
+    if not os.path.exists(marker):
+        return None
+    outputs = []
+    for name in stage.outputs:
+        base_path = os.path.join(stage_dir, name)
+        if os.path.exists(base_path + '.parquet'):
+            outputs.append(pd.read_parquet(base_path + '.parquet'))
+        elif os.path.exists(base_path + '.pkl'):
+            with open(base_path + '.pkl', 'rb') as f:
+                outputs.append(pickle.load(f))
+        else:
+            return None
+    os.utime(marker, None) # Recently used entries are evicted last
+    return tuple(outputs)
@@ -1,3 +1,8 @@
+import os
+import io
+import sys
+import argparse
+from contextlib import contextmanager, nullcontext
 import pandas as pd
 import datetime
 from collections import defaultdict
@@ -10,83 +15,279 @@ from step1_draft_etd import calculate_draft_etd_and_remaining_stock
 from step2_second_etd import calculate_second_etd
 from step3_final_etd import schedule_production_and_final_etd
 from excel_writer import write_output_to_excel
+from day_ordinals import convert_planning_dates_to_ordinals, date_to_day_ordinal
+from atp_quote import build_planning_state, save_planning_state
+from pipeline_stages import make_stage, run_stages, fingerprint_file
+from results_store import save_job_results
+from profiling import RunProfiler, describe_input_shape
+from delta_report import build_result_snapshot, save_result_snapshot, load_result_snapshot, compute_etd_delta, write_delta_report
+
+class InputDataError(Exception):
+    """Raised by the load stage when the input workbook cannot be read or validated."""
+
+# output_file value that sends the workbook to stdout instead of a file (used by app.py)
+STDOUT_OUTPUT = '-'
+
+def build_pipeline_stages():
+    """Declares the pipeline as stages with named inputs and outputs (see pipeline_stages.py)."""
+    today_ordinal = date_to_day_ordinal(config.TODAY_DATE)
+
+    def load_stage(input_file):
+        # Step 0: Load and Prepare Data
+        try:
+            stock_df, po_df, first_lot_df, capacity_status_df = load_and_prepare_data(
+                input_file,
+                config.OCD_COL_NAME,
+                parallel=config.PARALLEL_LOAD
+            )
+        except FileNotFoundError as e:
+            raise InputDataError(f"Input file '{input_file}' not found.") from e
+        except Exception as e:
+            raise InputDataError(f"Error reading or validating input file: {e}") from e
+
+        # All planning math below runs on int32 day ordinals; dates are formatted again only when writing output
+        return convert_planning_dates_to_ordinals(
+            stock_df,
+            po_df,
+            first_lot_df,
+            capacity_status_df,
+            config.OCD_COL_NAME,
+            config.FAR_FUTURE_DATE
+        )
+
+    def step1_stage(stock_df, po_df):
+        # Step 1: Calculate Draft ETD & Prepare Remaining Stock
+        draft_etd_df, remaining_stock_df, remaining_stock_state = calculate_draft_etd_and_remaining_stock(
+            stock_df, 
+            po_df, 
+            today_ordinal, 
+            config.LEAD_TIME_DAYS, 
+            config.OCD_COL_NAME,
+            return_stock_state=True
+        )
+        return draft_etd_df, remaining_stock_df, dict(remaining_stock_state)
+
+    def step2_stage(draft_etd_df, first_lot_df):
+        # Step 2: Calculate 2nd ETD with 1st Lot Status
+        # Step 2 cleans COLOR/Greige Code in place, so give it copies of the upstream artifacts
+        return calculate_second_etd(
+            draft_etd_df.copy(), 
+            first_lot_df.copy()
+        )
+
+    def step3_stage(draft_etd_df_with_2nd_etd, capacity_status_df):
+        # Step 3: Schedule Production and Final ETD
+        return schedule_production_and_final_etd(
+            draft_etd_df_with_2nd_etd, 
+            capacity_status_df, 
+            today_ordinal, 
+            config.LEAD_TIME_DAYS, 
+            config.CAPACITY_TOLERANCE, 
+            config.MIN_CAPACITY_REMAIN,
+            return_live_capacity=True
+        )
+
+    return [
+        make_stage('load', ['input_file'],
+                   ['stock_df', 'po_df', 'first_lot_df', 'capacity_status_df'], load_stage,
+                   params={'ocd_col_name': config.OCD_COL_NAME, 'far_future_date': config.FAR_FUTURE_DATE,
+                           'date_string_formats': tuple(config.DATE_STRING_FORMATS)},
+                   # Fingerprint each sheet by content so an edit to one sheet only invalidates its consumers
+                   content_fingerprint=True),
+        make_stage('step1', ['stock_df', 'po_df'],
+                   ['draft_etd_df', 'remaining_stock_df', 'remaining_stock_state'], step1_stage,
+                   params={'today': today_ordinal, 'lead_time_days': config.LEAD_TIME_DAYS,
+                           'ocd_col_name': config.OCD_COL_NAME}),
+        make_stage('step2', ['draft_etd_df', 'first_lot_df'],
+                   ['draft_etd_df_with_2nd_etd'], step2_stage),
+        make_stage('step3', ['draft_etd_df_with_2nd_etd', 'capacity_status_df'],
+                   ['final_etd_df', 'live_capacity'], step3_stage,
+                   params={'today': today_ordinal, 'lead_time_days': config.LEAD_TIME_DAYS,
+                           'capacity_tolerance': config.CAPACITY_TOLERANCE,
+                           'min_capacity_remain': config.MIN_CAPACITY_REMAIN}),
+    ]
 
 # --- Main Processing Logic --- (Orchestrator)
-def process_fabric_management(input_file=config.INPUT_EXCEL_FILE, output_file=config.OUTPUT_EXCEL_FILE):
+def process_fabric_management(input_file=config.INPUT_EXCEL_FILE, output_file=config.OUTPUT_EXCEL_FILE,
+                              previous_snapshot_file=config.PREVIOUS_SNAPSHOT_FILE,
+                              snapshot_file=config.SNAPSHOT_FILE,
+                              delta_output_file=config.DELTA_OUTPUT_FILE,
+                              planning_state_file=config.PLANNING_STATE_FILE,
+                              stage_cache_dir=config.STAGE_CACHE_DIR,
+                              rerun_from=config.RERUN_FROM_STAGE,
+                              results_store_prefix=config.RESULTS_STORE_PREFIX,
+                              profile_prefix=config.PROFILE_OUTPUT_PREFIX):
     """
     Orchestrates the fabric stock management and ETD calculation process
     by calling functions from specialized modules.
+
+    The load and Steps 1-3 run as stages (see build_pipeline_stages). With
+    ``stage_cache_dir`` set, each stage's outputs are materialized there keyed by a
+    fingerprint of its inputs, so a re-run only computes stages whose inputs changed
+    (e.g. only Step 3 when just the Capacity Status sheet changed), and a failed run
+    resumes from the last completed stage. ``rerun_from`` forces a stage and everything
+    downstream of it to run again.
+
+    If ``previous_snapshot_file`` exists, the POs whose ETDs or batch split changed since
+    that run are reported in ``delta_output_file`` (or an ETD DELTA sheet when it is None).
+    This run's snapshot is saved to ``snapshot_file`` for the next comparison.
+    If ``planning_state_file`` is set, the stock, lot status and capacity left after
+    Step 3 are saved there for ATP quotes (see atp_quote.py).
+    If ``results_store_prefix`` is set, the output sheets are also saved as columnar
+    files with that prefix for the results API (see results_store.py).
+    If ``profile_prefix`` is set, the run is profiled stage by stage and the profile is
+    saved with that prefix (see profiling.py).
+    With ``output_file`` set to '-', the workbook is built in memory and written to stdout,
+    and everything printed during the run goes to stderr instead.
     """
+    profiler = RunProfiler() if profile_prefix else None
+    output_context = _stdout_reserved_for_workbook() if output_file == STDOUT_OUTPUT else nullcontext(output_file)
+    with output_context as output_target:
+        if profiler:
+            profiler.start()
+        try:
+            _process_fabric_management(input_file, output_target, previous_snapshot_file, snapshot_file,
+                                       delta_output_file, planning_state_file, stage_cache_dir, rerun_from,
+                                       results_store_prefix, profiler)
+        finally:
+            # Saved even when the run fails, since a failing run may be the one to diagnose
+            if profiler:
+                profiler.stop()
+                profiler.save(profile_prefix)
+
+@contextmanager
+def _stdout_reserved_for_workbook():
+    """Points fd 1 at stderr for the duration, and yields a binary stream to the real stdout.
+
+    Redirecting the descriptor (not just sys.stdout) also covers prints from the
+    worker processes of a parallel load.
+    """
+    sys.stdout.flush()
+    stdout_fd = os.dup(1)
+    os.dup2(2, 1)
+    try:
+        with os.fdopen(stdout_fd, 'wb', closefd=False) as workbook_stream:
+            yield workbook_stream
+    finally:
+        sys.stdout.flush()
+        os.dup2(stdout_fd, 1)
+        os.close(stdout_fd)
+
+def _process_fabric_management(input_file, output_file, previous_snapshot_file, snapshot_file,
+                               delta_output_file, planning_state_file, stage_cache_dir, rerun_from,
+                               results_store_prefix, profiler):
+    # Every block below runs inside stage_scope(name), which profiles it when a profiler is given
+    stage_scope = profiler.stage if profiler else (lambda name: nullcontext())
+
     print(f"Starting fabric stock management processing for {input_file}...")
     print(f"Current date set to: {config.TODAY_DATE.strftime('%Y-%m-%d')}")
     print(f"Lead time: {config.LEAD_TIME_DAYS} days")
 
     try:
-        # Step 0: Load and Prepare Data
-        stock_df, po_df, first_lot_df, capacity_status_df = load_and_prepare_data(
-            input_file,
-            config.OCD_COL_NAME
-        )
-
+        sources = {'input_file': (input_file, fingerprint_file(input_file) if stage_cache_dir else None)}
+        artifacts = run_stages(build_pipeline_stages(), sources, cache_dir=stage_cache_dir, rerun_from=rerun_from,
+                               stage_scope=stage_scope, cache_max_bytes=config.STAGE_CACHE_MAX_BYTES,
+                               cache_max_age_seconds=config.STAGE_CACHE_MAX_AGE_SECONDS)
     except FileNotFoundError:
         print(f"Error: Input file '{input_file}' not found.")
         return
-    except Exception as e:
-        print(f"Error reading or validating input file: {e}")
+    except InputDataError as e:
+        print(f"Error: {e}")
         return
 
-    # Step 1: Calculate Draft ETD & Prepare Remaining Stock
-    draft_etd_df, remaining_stock_df = calculate_draft_etd_and_remaining_stock(
-        stock_df, 
-        po_df, 
-        config.TODAY_DATE, 
-        config.LEAD_TIME_DAYS, 
-        config.FAR_FUTURE_DATE,
-        config.OCD_COL_NAME
-    )
-
-    # Step 2: Calculate 2nd ETD with 1st Lot Status
-    # Ensure draft_etd_df is passed to step 2
-    draft_etd_df_with_2nd_etd = calculate_second_etd(
-        draft_etd_df, 
-        first_lot_df, 
-        config.FAR_FUTURE_DATE
-    )
-
-    # Step 3: Schedule Production and Final ETD
-    # Pass the output of step 2 to step 3
-    final_etd_df = schedule_production_and_final_etd(
-        draft_etd_df_with_2nd_etd, 
-        capacity_status_df, 
-        config.TODAY_DATE, 
-        config.LEAD_TIME_DAYS, 
-        config.FAR_FUTURE_DATE, 
-        config.CAPACITY_TOLERANCE, 
-        config.MIN_CAPACITY_REMAIN
-    )
+    draft_etd_df_with_2nd_etd = artifacts['draft_etd_df_with_2nd_etd']
+    remaining_stock_df = artifacts['remaining_stock_df']
+    final_etd_df = artifacts['final_etd_df']
+    today_ordinal = date_to_day_ordinal(config.TODAY_DATE)
+    if profiler:
+        profiler.input_shape = describe_input_shape(
+            input_file,
+            artifacts['stock_df'],
+            artifacts['po_df'],
+            artifacts['first_lot_df'],
+            artifacts['capacity_status_df']
+        )
+
+    # Keep the post-Step-3 state for ATP quotes (optional)
+    if planning_state_file:
+        with stage_scope('planning_state'):
+            save_planning_state(
+                build_planning_state(
+                    artifacts['remaining_stock_state'],
+                    artifacts['first_lot_df'],
+                    artifacts['live_capacity'],
+                    today_ordinal,
+                    config.LEAD_TIME_DAYS,
+                    config.CAPACITY_TOLERANCE,
+                    config.MIN_CAPACITY_REMAIN,
+                    config.FAR_FUTURE_DATE_DISPLAY_STR
+                ),
+                planning_state_file
+            )
+
+    # Delta against the previous run's results (optional)
+    with stage_scope('delta'):
+        result_snapshot_df = build_result_snapshot(final_etd_df)
+        delta_df = None
+        if previous_snapshot_file and os.path.exists(previous_snapshot_file):
+            delta_df = compute_etd_delta(load_result_snapshot(previous_snapshot_file), result_snapshot_df)
+            if delta_output_file:
+                write_delta_report(delta_df, delta_output_file)
+                delta_df = None # Written separately, keep it out of the workbook
+        elif previous_snapshot_file:
+            print(f"Previous snapshot '{previous_snapshot_file}' not found; skipping ETD delta report.")
 
     # Step 4: Output Results to Excel
-    write_output_to_excel(
-        output_file, 
-        draft_etd_df_with_2nd_etd, # This contains Draft ETD, 1st Lot, and 2nd ETD
-        remaining_stock_df, 
-        final_etd_df, 
-        config.FAR_FUTURE_DATE, 
-        config.OCD_COL_NAME
-    )
+    with stage_scope('write_output'):
+        # A stream (stdout) is not seekable, so the workbook is built in an in-memory buffer first
+        write_to_stream = not isinstance(output_file, (str, os.PathLike))
+        output_buffer = io.BytesIO() if write_to_stream else None
+        write_output_to_excel(
+            output_buffer if write_to_stream else output_file, 
+            draft_etd_df_with_2nd_etd, # This contains Draft ETD, 1st Lot, and 2nd ETD
+            remaining_stock_df, 
+            final_etd_df, 
+            config.OCD_COL_NAME,
+            config.FAR_FUTURE_DATE_DISPLAY_STR,
+            delta_df=delta_df
+        )
+        if write_to_stream:
+            output_file.write(output_buffer.getbuffer())
+            output_file.flush()
+
+    if results_store_prefix:
+        with stage_scope('results_store'):
+            save_job_results(
+                results_store_prefix,
+                draft_etd_df_with_2nd_etd,
+                remaining_stock_df,
+                final_etd_df,
+                config.OCD_COL_NAME
+            )
+
+    if snapshot_file:
+        with stage_scope('snapshot'):
+            save_result_snapshot(result_snapshot_df, snapshot_file)
 
 # --- Entry Point --- (Remains the same)
 if __name__ == "__main__":
     # Example: Create a dummy input file if it doesn't exist (for basic testing)
     # This part should be more elaborate to match the new complex structure if used for testing.
     # For now, it's better to ensure 'PO - Request.xlsx' exists with the correct sheets.
+    parser = argparse.ArgumentParser(description="Process the PO workbook configured in config.py.")
+    parser.add_argument('--profile', metavar='PREFIX', default=config.PROFILE_OUTPUT_PREFIX,
+                        help="profile the run and save PREFIX_profile.pstats/.collapsed/.json "
+                             "(default: PROFILE_OUTPUT_PREFIX from config.py)")
+    args = parser.parse_args()
+    # Keep stdout clean when it carries the workbook
+    log_stream = sys.stderr if config.OUTPUT_EXCEL_FILE == STDOUT_OUTPUT else sys.stdout
     try:
         # Check if the specific input file exists
         with open(config.INPUT_EXCEL_FILE, 'rb') as f:
             pass
-        print(f"Found input file: {config.INPUT_EXCEL_FILE}. Running main process...")
-        process_fabric_management()
+        print(f"Found input file: {config.INPUT_EXCEL_FILE}. Running main process...", file=log_stream)
+        process_fabric_management(profile_prefix=args.profile)
     except FileNotFoundError:
-        print(f"ERROR: Input file '{config.INPUT_EXCEL_FILE}' not found.")
-        print("Please ensure the input Excel file with all required sheets (Stock, PO, 1ST LOT STATUS, Capacity Status) is in the same directory as the script.")
-        print("You may need to run a script to generate a dummy input file first (e.g., create_template_file.py).") 
\ No newline at end of file
+        print(f"ERROR: Input file '{config.INPUT_EXCEL_FILE}' not found.", file=log_stream)
+        print("Please ensure the input Excel file with all required sheets (Stock, PO, 1ST LOT STATUS, Capacity Status) is in the same directory as the script.", file=log_stream)
+        print("You may need to run a script to generate a dummy input file first (e.g., create_template_file.py).", file=log_stream) 
\ No newline at end of file
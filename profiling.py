@@ -0,0 +1,167 @@
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# --- Run profiling ---
+# A profiled run records two views of the same run, split by pipeline stage:
+# * a deterministic cProfile per stage, combined into one .pstats file (snakeviz,
+#   `python -m pstats`) with the top functions of each stage in the JSON summary;
+# * stack samples of the main thread taken every few milliseconds, written as collapsed
+#   stacks ("stage;file:function;... count") for flamegraph.pl or speedscope.
+# The JSON summary also holds per-stage wall/CPU times and the shape of the input, so a
+# slow run can be diagnosed from the artifacts alone.
+
+PROFILE_SAMPLE_INTERVAL_SECONDS = 0.005
+PROFILE_TOP_FUNCTIONS = 15
+# Root frame for samples taken outside any stage (e.g. config import, printing)
+OUTSIDE_STAGES = '(outside stages)'
+
+def profile_artifact_paths(profile_prefix):
+    """Returns the paths of the files a profiled run writes, keyed by artifact kind."""
+    return {
+        'pstats': f"{profile_prefix}_profile.pstats",
+        'collapsed': f"{profile_prefix}_profile.collapsed",
+        'json': f"{profile_prefix}_profile.json",
+    }
+
+def describe_input_shape(input_file, stock_df, po_df, first_lot_df, capacity_status_df):
+    """Returns size statistics of a run's input, the numbers that drive its run time."""
+    sheets = {'Stock': stock_df, 'PO': po_df, '1ST LOT STATUS': first_lot_df, 'Capacity Status': capacity_status_df}
+    return {
+        'input_file_bytes': os.path.getsize(input_file) if os.path.exists(input_file) else None,
+        'sheets': {name: {'rows': int(len(df)), 'columns': int(len(df.columns))} for name, df in sheets.items()},
+        'distinct_greige_codes_in_stock': int(stock_df['Greige Code'].nunique()) if 'Greige Code' in stock_df.columns else None,
+        'distinct_greige_codes_in_po': int(po_df['Greige Code'].nunique()) if 'Greige Code' in po_df.columns else None,
+        'capacity_days': int(capacity_status_df['CAPACITY DATE'].nunique()) if 'CAPACITY DATE' in capacity_status_df.columns else None,
+    }
+
+class RunProfiler:
+    """Profiles one pipeline run; wrap each stage in ``with profiler.stage(name):``.
+
+    Call start() before the run and stop() after it, then save() to write the artifacts.
+    """
+
+    def __init__(self, sample_interval_seconds=PROFILE_SAMPLE_INTERVAL_SECONDS):
+        self.sample_interval_seconds = sample_interval_seconds
+        self.stage_profiles = {}
+        self.stage_timings = {}
+        self.samples = Counter()
+        self.input_shape = None
+        self._current_stage = None
+        self._target_thread_id = None
+        self._stop_event = threading.Event()
+        self._sampler = None
+        self._wall_start = None
+        self._wall_seconds = None
+
+    def start(self):
+        """Starts sampling the calling thread."""
+        self._target_thread_id = threading.get_ident()
+        self._wall_start = time.perf_counter()
+        self._stop_event.clear()
+        self._sampler = threading.Thread(target=self._sample_loop, name='run-profiler-sampler', daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        """Stops sampling."""
+        self._stop_event.set()
+        if self._sampler is not None:
+            self._sampler.join()
+            self._sampler = None
+        if self._wall_start is not None:
+            self._wall_seconds = time.perf_counter() - self._wall_start
+
+    @contextmanager
+    def stage(self, name):
+        """Profiles the enclosed block as the named stage."""
+        if self._current_stage is not None:
+            yield # Nested blocks count towards the enclosing stage
+            return
+        profile = self.stage_profiles.setdefault(name, cProfile.Profile())
+        timing = self.stage_timings.setdefault(name, {'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'calls': 0})
+        self._current_stage = name
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            timing['wall_seconds'] += time.perf_counter() - wall_start
+            timing['cpu_seconds'] += time.process_time() - cpu_start
+            timing['calls'] += 1
+            self._current_stage = None
+
+    def _sample_loop(self):
+        while not self._stop_event.wait(self.sample_interval_seconds):
+            frame = sys._current_frames().get(self._target_thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            stack.append(self._current_stage or OUTSIDE_STAGES)
+            self.samples[';'.join(reversed(stack))] += 1
+
+    def summary(self):
+        """Returns stage timings, top functions per stage and the input shape as a dict."""
+        stages = {}
+        for name, timing in self.stage_timings.items():
+            stats = pstats.Stats(self.stage_profiles[name])
+            stats.sort_stats('cumulative')
+            top_functions = []
+            for func in stats.fcn_list[:PROFILE_TOP_FUNCTIONS]:
+                primitive_calls, total_calls, total_time, cumulative_time, _ = stats.stats[func]
+                filename, line, function = func
+                top_functions.append({
+                    'function': f"{os.path.basename(filename)}:{line}({function})",
+                    'calls': total_calls,
+                    'total_seconds': round(total_time, 6),
+                    'cumulative_seconds': round(cumulative_time, 6),
+                })
+            stages[name] = {
+                'wall_seconds': round(timing['wall_seconds'], 6),
+                'cpu_seconds': round(timing['cpu_seconds'], 6),
+                'calls': timing['calls'],
+                'top_functions': top_functions,
+            }
+        return {
+            'wall_seconds': round(self._wall_seconds, 6) if self._wall_seconds is not None else None,
+            'stages': stages,
+            'input_shape': self.input_shape,
+            'sample_interval_seconds': self.sample_interval_seconds,
+            'sample_count': sum(self.samples.values()),
+        }
+
+    def save(self, profile_prefix):
+        """Writes the .pstats, .collapsed and .json artifacts and returns their paths."""
+        paths = profile_artifact_paths(profile_prefix)
+        print(f"Saving profile to {profile_prefix}_profile.*...")
+
+        profiles = list(self.stage_profiles.values())
+        if profiles:
+            stats = pstats.Stats(profiles[0])
+            for profile in profiles[1:]:
+                stats.add(profile)
+            stats.dump_stats(paths['pstats'])
+        else:
+            cProfile.Profile().dump_stats(paths['pstats']) # Nothing ran; keep the artifact set complete
+
+        with open(paths['collapsed'], 'w') as f:
+            for stack, count in sorted(self.samples.items()):
+                f.write(f"{stack} {count}\n")
+
+        summary = self.summary()
+        with open(paths['json'], 'w') as f:
+            json.dump(summary, f, indent=2)
+
+        for name, stage in summary['stages'].items():
+            print(f"  {name}: {stage['wall_seconds']:.3f}s wall, {stage['cpu_seconds']:.3f}s CPU")
+        return paths
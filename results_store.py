@@ -0,0 +1,246 @@
+import base64
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from day_ordinals import from_day_ordinals
+from excel_writer import prepare_draft_etd_sheet, prepare_final_etd_sheet, draft_etd_date_columns, final_etd_date_columns
+
+# --- Stored result frames ---
+# After a run, the rows of the FINAL ETD, DRAFT ETD and REMAINING STOCK sheets are also
+# saved as one Parquet file per sheet ("<prefix>_results_<sheet>.parquet"), with dates as
+# datetime64 columns. The web app loads a file
+# once, builds hash indexes on the lookup columns and answers filtered, sorted, paginated
+# queries from memory instead of re-opening the output workbook.
+
+RESULT_SHEETS = {
+    'final-etd': 'FINAL ETD',
+    'draft-etd': 'DRAFT ETD',
+    'remaining-stock': 'REMAINING STOCK',
+}
+# Query parameter -> column, matched exactly (case-insensitive, surrounding spaces ignored)
+FILTER_COLUMNS = {'po': 'PO', 'greige_code': 'Greige Code', 'color': 'COLOR'}
+# Column filtered by etd_from/etd_to when the query does not name one
+DEFAULT_ETD_COLUMNS = {'final-etd': 'FINAL ETD', 'draft-etd': '2nd ETD'}
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+def result_file_path(results_prefix, sheet):
+    """Returns the stored result file for a sheet key, or None if it has not been saved."""
+    path = f"{results_prefix}_results_{sheet}.parquet"
+    return path if os.path.exists(path) else None
+
+def save_job_results(results_prefix, draft_etd_df, remaining_stock_df, final_etd_df, ocd_col_name):
+    """Saves the rows of the three output sheets as columnar files next to the output workbook.
+
+    Columns and values match the workbook, except that dates are stored as dates
+    (null where the workbook shows config.FAR_FUTURE_DATE_DISPLAY_STR), and a column
+    mixing numbers and text is stored as text, since Parquet columns have one type.
+    """
+    print(f"Saving result tables to {results_prefix}_results_*...")
+    sheets = {
+        'final-etd': _with_dates(prepare_final_etd_sheet(final_etd_df, ocd_col_name), final_etd_date_columns(ocd_col_name)),
+        'draft-etd': _with_dates(prepare_draft_etd_sheet(draft_etd_df, ocd_col_name), draft_etd_date_columns(ocd_col_name)),
+        'remaining-stock': remaining_stock_df.reset_index(drop=True),
+    }
+    for sheet, df in sheets.items():
+        _save_table(_with_single_typed_columns(df), f"{results_prefix}_results_{sheet}.parquet")
+
+def _with_dates(df, date_cols):
+    df = df.reset_index(drop=True)
+    return df.assign(**{col: from_day_ordinals(df[col]) for col in date_cols if col in df.columns})
+
+def _with_single_typed_columns(df):
+    mixed_cols = [col for col in df.columns
+                  if df[col].dtype == object and pd.api.types.infer_dtype(df[col], skipna=True) not in ('string', 'empty')]
+    return df.assign(**{col: df[col].map(lambda value: value if pd.isna(value) else str(value)) for col in mixed_cols})
+
+def _save_table(df, path):
+    # Write to a temporary file and rename it into place, so a reader never sees a partial table
+    out_dir = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=out_dir, suffix='.tmp')
+    os.close(fd)
+    try:
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+class ResultTable:
+    """One stored result sheet held in memory, with hash indexes on its lookup columns.
+
+    Each index maps a normalized value to the row positions holding it, so an exact
+    filter is a dictionary lookup; sort orders are computed once per column and reused.
+    Values are also kept JSON-ready per column, so building a page is plain array indexing.
+    """
+
+    def __init__(self, df):
+        self.df = df.reset_index(drop=True)
+        self.date_columns = [col for col in self.df.columns if pd.api.types.is_datetime64_any_dtype(self.df[col])]
+        self.indexes = {}
+        for col in FILTER_COLUMNS.values():
+            if col in self.df.columns:
+                keys = self.df[col].map(_normalize_key)
+                self.indexes[col] = {key: positions for key, positions in keys.groupby(keys, sort=False).indices.items()}
+        self._sort_orders = {}
+        self._json_columns = [_json_ready_values(self.df[col], col in self.date_columns) for col in self.df.columns]
+
+    def records(self, positions):
+        """Returns the rows at the given positions as JSON-serializable dicts."""
+        columns = list(self.df.columns)
+        return [dict(zip(columns, row)) for row in zip(*(values[positions] for values in self._json_columns))]
+
+    def sort_order(self, col, descending):
+        """Returns row positions sorted by a column (stable, nulls last)."""
+        key = (col, descending)
+        if key not in self._sort_orders:
+            sorted_df = self.df[[col]].sort_values(col, ascending=not descending, kind='stable', na_position='last')
+            self._sort_orders[key] = sorted_df.index.to_numpy()
+        return self._sort_orders[key]
+
+def load_result_table(path):
+    """Loads a stored result file into a ResultTable."""
+    return ResultTable(pd.read_parquet(path))
+
+def _json_ready_values(values, is_date):
+    if is_date:
+        values = values.dt.strftime('%Y-%m-%d')
+    # JSON has no NaN/NA; missing values (including unscheduled dates) become null
+    json_values = np.empty(len(values), dtype=object)
+    json_values[:] = [value.item() if isinstance(value, np.generic) else value for value in values.astype(object)]
+    json_values[values.isna().to_numpy()] = None
+    return json_values
+
+def _normalize_key(value):
+    if value is None or pd.isna(value):
+        return ''
+    return str(value).strip().upper()
+
+def parse_results_query(args, sheet):
+    """Validates query parameters for a result sheet and returns the query as a dict.
+
+    ``args`` is a mapping of parameter names to values; lookup filters may be repeated
+    when it has getlist() (e.g. a Flask request.args). Raises ValueError for bad input.
+    """
+    if sheet not in RESULT_SHEETS:
+        raise ValueError(f"Unknown sheet '{sheet}'. Expected one of: {', '.join(RESULT_SHEETS)}.")
+
+    def get_all(name):
+        values = args.getlist(name) if hasattr(args, 'getlist') else [args[name]] if name in args else []
+        return [value for value in values if str(value).strip() != '']
+
+    filters = {}
+    for param, col in FILTER_COLUMNS.items():
+        values = get_all(param)
+        if values:
+            filters[col] = sorted({_normalize_key(value) for value in values})
+
+    etd_from, etd_to = _parse_query_date(args.get('etd_from'), 'etd_from'), _parse_query_date(args.get('etd_to'), 'etd_to')
+    etd_column = args.get('etd_column') or DEFAULT_ETD_COLUMNS.get(sheet)
+    if (etd_from is not None or etd_to is not None) and etd_column is None:
+        raise ValueError(f"Sheet '{sheet}' has no ETD column; pass etd_column to filter by a date range.")
+
+    sort = args.get('sort') or None
+    descending = False
+    if sort and sort.startswith('-'):
+        sort, descending = sort[1:], True
+
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except (TypeError, ValueError):
+        raise ValueError("limit must be an integer.")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}.")
+
+    query = {
+        'sheet': sheet,
+        'filters': filters,
+        'etd_column': etd_column if (etd_from is not None or etd_to is not None) else None,
+        'etd_from': etd_from,
+        'etd_to': etd_to,
+        'sort': sort,
+        'descending': descending,
+        'limit': limit,
+    }
+    query['offset'] = _decode_cursor(args.get('cursor'), query)
+    return query
+
+def _parse_query_date(value, name):
+    if value is None or str(value).strip() == '':
+        return None
+    date_value = pd.to_datetime(value, errors='coerce', format='%Y-%m-%d')
+    if pd.isna(date_value):
+        raise ValueError(f"{name} must be a date in YYYY-MM-DD format.")
+    return date_value
+
+def _query_signature(query):
+    # A cursor is only valid for the query that produced it (same sheet, filters and sort)
+    fields = {key: query[key] for key in ('sheet', 'filters', 'etd_column', 'etd_from', 'etd_to', 'sort', 'descending')}
+    return hashlib.sha256(json.dumps(fields, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+def _encode_cursor(offset, query):
+    payload = json.dumps({'o': offset, 'q': _query_signature(query)}).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+def _decode_cursor(cursor, query):
+    if not cursor:
+        return 0
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        offset, signature = int(payload['o']), payload['q']
+    except Exception:
+        raise ValueError("Invalid cursor.")
+    if signature != _query_signature(query) or offset < 0:
+        raise ValueError("Cursor does not belong to this query; start again without a cursor.")
+    return offset
+
+def query_results(table, query):
+    """Returns one page of rows matching a parsed query, with the cursor for the next page."""
+    df = table.df
+    mask = np.ones(len(df), dtype=bool)
+
+    for col, values in query['filters'].items():
+        if col not in table.indexes:
+            raise ValueError(f"Sheet '{query['sheet']}' cannot be filtered by {col}.")
+        index = table.indexes[col]
+        col_mask = np.zeros(len(df), dtype=bool)
+        for value in values:
+            positions = index.get(value)
+            if positions is not None:
+                col_mask[positions] = True
+        mask &= col_mask
+
+    if query['etd_column'] is not None:
+        etd_column = query['etd_column']
+        if etd_column not in table.date_columns:
+            raise ValueError(f"'{etd_column}' is not a date column of sheet '{query['sheet']}'.")
+        etd_values = df[etd_column]
+        in_range = etd_values.notna().to_numpy().copy()
+        if query['etd_from'] is not None:
+            in_range &= (etd_values >= query['etd_from']).to_numpy()
+        if query['etd_to'] is not None:
+            in_range &= (etd_values <= query['etd_to']).to_numpy()
+        mask &= in_range
+
+    if query['sort']:
+        if query['sort'] not in df.columns:
+            raise ValueError(f"Cannot sort by unknown column '{query['sort']}'.")
+        order = table.sort_order(query['sort'], query['descending'])
+        positions = order[mask[order]]
+    else:
+        positions = np.flatnonzero(mask) # Workbook order
+
+    offset, limit = query['offset'], query['limit']
+    page_positions = positions[offset:offset + limit]
+    next_offset = offset + len(page_positions)
+    return {
+        'sheet': RESULT_SHEETS[query['sheet']],
+        'columns': list(df.columns), # Row objects may not keep column order once serialized
+        'total': int(len(positions)),
+        'count': int(len(page_positions)),
+        'rows': table.records(page_positions),
+        'next_cursor': _encode_cursor(next_offset, query) if next_offset < len(positions) else None,
+    }
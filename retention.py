@@ -0,0 +1,138 @@
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+# Files created by app.py are named "<uuid4>_<name>"; anything else in the managed
+# folders (e.g. the rest of /tmp on Vercel) is never counted or deleted.
+JOB_FILE_PATTERN = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}_')
+
+def _job_id(path):
+    # The uuid in front of a job file's name
+    return os.path.basename(path).split('_', 1)[0]
+
+class RetentionManager:
+    """Keeps the job files in a set of folders under a total size cap and a maximum age.
+
+    Files older than ``max_age_seconds`` are removed first; if the folders are still
+    over ``max_bytes``, the least recently used files are evicted until they fit.
+    "Used" is the later of the file's access and modification times; call touch()
+    when a file is served so it counts as recently used even on noatime mounts.
+
+    Files of a job registered with begin_job() are never removed until end_job(), and
+    no file modified in the last ``min_age_seconds`` is removed at all. The grace period
+    covers jobs this manager cannot see (e.g. in another gunicorn worker), so it should
+    be longer than a job can run.
+    """
+
+    def __init__(self, folders, max_bytes, max_age_seconds, sweep_interval_seconds=300, min_age_seconds=0):
+        self.folders = list(dict.fromkeys(os.path.abspath(folder) for folder in folders))
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.sweep_interval_seconds = sweep_interval_seconds
+        self.min_age_seconds = min_age_seconds
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+        self._last_result = None
+        self._active_jobs = Counter()
+
+    def begin_job(self, job_id):
+        """Registers a running job; its files are kept until end_job() is called."""
+        with self._lock:
+            self._active_jobs[job_id] += 1
+
+    def end_job(self, job_id):
+        """Releases a job registered with begin_job()."""
+        with self._lock:
+            self._active_jobs[job_id] -= 1
+            if self._active_jobs[job_id] <= 0:
+                del self._active_jobs[job_id]
+
+    def _job_files(self):
+        """Yields (path, size, last_used, modified) for every job file in the managed folders."""
+        for folder in self.folders:
+            try:
+                entries = list(os.scandir(folder))
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                if not JOB_FILE_PATTERN.match(entry.name):
+                    continue
+                try:
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    stat = entry.stat(follow_symlinks=False)
+                except FileNotFoundError:
+                    continue # Removed by a concurrent request
+                yield entry.path, stat.st_size, max(stat.st_atime, stat.st_mtime), stat.st_mtime
+
+    def usage(self):
+        """Returns current usage of the managed folders for monitoring."""
+        files = list(self._job_files())
+        now = time.time()
+        return {
+            'folders': self.folders,
+            'file_count': len(files),
+            'total_bytes': sum(size for _, size, _, _ in files),
+            'max_bytes': self.max_bytes,
+            'oldest_file_age_seconds': round(now - min(used for _, _, used, _ in files), 1) if files else None,
+            'max_age_seconds': self.max_age_seconds,
+            'active_jobs': len(self._active_jobs),
+            'last_sweep': self._last_result,
+        }
+
+    def sweep(self, protect=()):
+        """Removes expired files, then evicts least recently used files until under the size cap.
+
+        Paths in ``protect`` (e.g. an output that is about to be downloaded), files of
+        running jobs and files younger than ``min_age_seconds`` are never removed, but
+        still count towards the total.
+        """
+        protected = {os.path.abspath(path) for path in protect}
+        with self._lock:
+            now = time.time()
+            files = sorted(self._job_files(), key=lambda f: f[2]) # Least recently used first
+            total_bytes = sum(size for _, size, _, _ in files)
+            removed_files, removed_bytes = 0, 0
+
+            for path, size, last_used, modified in files:
+                if path in protected or now - modified < self.min_age_seconds:
+                    continue
+                if _job_id(path) in self._active_jobs:
+                    continue
+                expired = now - last_used > self.max_age_seconds
+                if not expired and total_bytes <= self.max_bytes:
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"Retention: could not remove {path}: {e}")
+                    continue
+                total_bytes -= size
+                removed_files += 1
+                removed_bytes += size
+
+            self._last_sweep = now
+            self._last_result = {
+                'time': now,
+                'removed_files': removed_files,
+                'removed_bytes': removed_bytes,
+                'total_bytes_after': total_bytes,
+            }
+            return self._last_result
+
+    def maybe_sweep(self):
+        """Sweeps if at least ``sweep_interval_seconds`` have passed since the last sweep."""
+        if time.time() - self._last_sweep < self.sweep_interval_seconds:
+            return None
+        return self.sweep()
+
+    def touch(self, path):
+        """Marks a file as just used so LRU eviction keeps it longer."""
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
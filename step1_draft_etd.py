@@ -1,11 +1,16 @@
 import pandas as pd
 from collections import defaultdict
+from day_ordinals import ORDINAL_DTYPE, day_ordinal_to_date
 
-def calculate_draft_etd_and_remaining_stock(stock_df, po_df, today_date, lead_time_days, far_future_date, ocd_col_name):
-    """Calculates Draft ETD for POs and prepares the remaining stock summary."""
-    print("Step 1: Calculating Draft ETD and Preparing Remaining Stock...")
+# Position of each line in the cleaned PO sheet, carried through Steps 1-3 because the
+# steps reorder lines by priority (used to number repeated lines in delta_report.py)
+PO_ROW_COL = 'PO ROW'
 
-    # Prepare stock_data dictionary from stock_df
+def build_stock_state(stock_df, today_date):
+    """Builds the per-Greige-Code stock state (on-hand quantity and incoming batches sorted by ETA).
+
+    Greige ETA and today_date are day ordinals (see day_ordinals.py).
+    """
     stock_data_dict = defaultdict(lambda: {'available_on_hand': 0, 'incoming_batches': []})
     for _, row in stock_df.iterrows():
         dsm_code = row['Greige Code']
@@ -19,9 +24,68 @@ def calculate_draft_etd_and_remaining_stock(stock_df, po_df, today_date, lead_ti
   
     for dsm_code in stock_data_dict:
         stock_data_dict[dsm_code]['incoming_batches'].sort(key=lambda x: x['eta'])
+    return stock_data_dict
+
+def allocate_stock_for_po(current_stock_info, requested_qty, today_date, lead_time_days):
+    """Allocates stock to one PO line (consuming it from current_stock_info) and returns its Draft ETD.
+
+    Dates are day ordinals; None means there is not enough stock.
+    """
+    draft_etd_val = None
+    needed = requested_qty
+    material_available_date = None
+
+    if current_stock_info['available_on_hand'] >= needed:
+        current_stock_info['available_on_hand'] -= needed
+        material_available_date = today_date
+        needed = 0
+    else:
+        if current_stock_info['available_on_hand'] > 0:
+             material_available_date = today_date # Used some on-hand
+        needed -= current_stock_info['available_on_hand']
+        current_stock_info['available_on_hand'] = 0
+        
+        batches_to_keep = []
+        for batch in current_stock_info['incoming_batches']:
+            if needed == 0:
+                batches_to_keep.append(batch)
+                continue
+            
+            material_available_date = batch['eta'] if material_available_date is None else max(material_available_date, batch['eta'])
+            
+            if batch['quantity'] >= needed:
+                batch['quantity'] -= needed
+                needed = 0
+                if batch['quantity'] > 0:
+                    batches_to_keep.append(batch)
+                break 
+            else:
+                needed -= batch['quantity']
+        current_stock_info['incoming_batches'] = batches_to_keep
+
+    if needed == 0:
+        if material_available_date is not None:
+            draft_etd_val = material_available_date + lead_time_days
+    return draft_etd_val
+
+def calculate_draft_etd_and_remaining_stock(stock_df, po_df, today_date, lead_time_days, ocd_col_name, return_stock_state=False):
+    """Calculates Draft ETD for POs and prepares the remaining stock summary.
+
+    All dates, including today_date and the Draft ETD column, are day ordinals (see day_ordinals.py);
+    a null Draft ETD means there is not enough stock.
+
+    With ``return_stock_state=True`` the remaining per-Greige-Code stock state (same layout as
+    build_stock_state) is returned as a third value.
+    """
+    print("Step 1: Calculating Draft ETD and Preparing Remaining Stock...")
+
+    # Prepare stock_data dictionary from stock_df
+    stock_data_dict = build_stock_state(stock_df, today_date)
 
     # Prioritize POs
     po_df_sorted = po_df.copy()
+    if PO_ROW_COL not in po_df_sorted.columns:
+        po_df_sorted[PO_ROW_COL] = range(len(po_df_sorted))
     po_df_sorted['Forecasted_Sort'] = po_df_sorted['Forecasted'].apply(lambda x: 0 if x == 'yes' else 1)
     po_df_sorted = po_df_sorted.sort_values(by=['Forecasted_Sort', 'CHD'])
 
@@ -36,51 +100,21 @@ def calculate_draft_etd_and_remaining_stock(stock_df, po_df, today_date, lead_ti
     for _, po_row in po_df_sorted.iterrows():
         dsm_code = po_row['Greige Code']
         requested_qty = po_row['Quantity request']
-        draft_etd_val = far_future_date 
-        current_stock_info = stock_for_draft_etd[dsm_code]
-        needed = requested_qty
-        material_available_date = far_future_date
-
-        if current_stock_info['available_on_hand'] >= needed:
-            current_stock_info['available_on_hand'] -= needed
-            material_available_date = today_date
-            needed = 0
-        else:
-            if current_stock_info['available_on_hand'] > 0:
-                 material_available_date = today_date # Used some on-hand
-            needed -= current_stock_info['available_on_hand']
-            current_stock_info['available_on_hand'] = 0
-            
-            batches_to_keep = []
-            for batch in current_stock_info['incoming_batches']:
-                if needed == 0:
-                    batches_to_keep.append(batch)
-                    continue
-                
-                material_available_date = max(material_available_date if material_available_date != far_future_date else batch['eta'], batch['eta'])
-                
-                if batch['quantity'] >= needed:
-                    batch['quantity'] -= needed
-                    needed = 0
-                    if batch['quantity'] > 0:
-                        batches_to_keep.append(batch)
-                    break 
-                else:
-                    needed -= batch['quantity']
-            current_stock_info['incoming_batches'] = batches_to_keep
-
-        if needed == 0:
-            if material_available_date != far_future_date:
-                draft_etd_val = material_available_date + pd.Timedelta(days=lead_time_days)
+        draft_etd_val = allocate_stock_for_po(
+            stock_for_draft_etd[dsm_code], requested_qty, today_date, lead_time_days
+        )
         
         result_row = po_row.to_dict()
         result_row['Draft ETD'] = draft_etd_val
         draft_etd_results.append(result_row)
 
     draft_etd_df = pd.DataFrame(draft_etd_results)
+    if not draft_etd_df.empty:
+        draft_etd_df['Draft ETD'] = pd.array(draft_etd_df['Draft ETD'].tolist(), dtype=ORDINAL_DTYPE)
 
     # Prepare Remaining Stock DataFrame
     remaining_stock_list = []
+    today_date_str = day_ordinal_to_date(today_date).strftime("%Y-%m-%d")
     # Greige Name is sourced from po_df as per user request
     dsm_to_cpt_name_map = po_df.drop_duplicates(subset=['Greige Code']).set_index('Greige Code')['Greige Name'].to_dict()
     all_dsm_codes_for_remaining = set(stock_df['Greige Code'].unique()) | set(po_df['Greige Code'].unique())
@@ -92,15 +126,17 @@ def calculate_draft_etd_and_remaining_stock(stock_df, po_df, today_date, lead_ti
         incoming_batches_str_list = []
         for batch in stock_status['incoming_batches']:
             if batch['quantity'] > 0:
-                eta_str = batch['eta'].strftime('%Y-%m-%d') if pd.notna(batch['eta']) else 'N/A'
+                eta_str = day_ordinal_to_date(batch['eta']).strftime('%Y-%m-%d') if pd.notna(batch['eta']) else 'N/A'
                 incoming_batches_str_list.append(f"ETA: {eta_str}, Qty: {int(batch['quantity'])}")
         remaining_incoming_str = "; ".join(incoming_batches_str_list) if incoming_batches_str_list else "None"
         remaining_stock_list.append({
             'Greige Code': dsm_code,
             'Greige Name': cpt_name,
-            f'Remaining Available (as of {today_date.strftime("%Y-%m-%d")})': remaining_on_hand,
+            f'Remaining Available (as of {today_date_str})': remaining_on_hand,
             'Remaining Incoming Batches': remaining_incoming_str
         })
     remaining_stock_df = pd.DataFrame(remaining_stock_list)
     print("Step 1 finished.")
+    if return_stock_state:
+        return draft_etd_df, remaining_stock_df, stock_for_draft_etd
     return draft_etd_df, remaining_stock_df 
\ No newline at end of file
@@ -1,7 +1,39 @@
 import pandas as pd
+from day_ordinals import ORDINAL_DTYPE
 
-def calculate_second_etd(draft_etd_df, first_lot_df, far_future_date):
-    """Calculates the 2nd ETD based on 1st Lot Status."""
+def second_etd_from_lot_status(draft_etd, lot_status, due_date, due_date_never=False):
+    """Applies the 1st Lot Status rule to one line's Draft ETD and returns its 2nd ETD.
+
+    Dates are day ordinals; a null Draft ETD (not enough stock) stays null. A null DUE DATE
+    is ignored, but an EXPIRED lot whose DUE DATE is "never" (the far-future sentinel in the
+    input, see day_ordinals.py) gives a null 2nd ETD, since that date is later than any Draft ETD.
+    """
+    lot_status = str(lot_status).strip().upper() if pd.notna(lot_status) else None
+
+    if pd.isna(draft_etd):
+        return draft_etd 
+
+    if lot_status is None:
+        return draft_etd
+
+    if lot_status == 'OK':
+        return draft_etd
+    elif lot_status == 'EXPIRED':
+        if due_date_never:
+            return None
+        if pd.isna(due_date):
+            return draft_etd
+        if due_date <= draft_etd:
+            return draft_etd
+        else: 
+            return due_date
+    return draft_etd
+
+def calculate_second_etd(draft_etd_df, first_lot_df):
+    """Calculates the 2nd ETD based on 1st Lot Status.
+
+    Date columns (Draft ETD, DUE DATE and the resulting 2nd ETD) are day ordinals (see day_ordinals.py).
+    """
     print("Step 2: Calculating 2nd ETD with 1st Lot Status...")
     
     # Print debug information before cleaning
@@ -25,20 +57,15 @@ def calculate_second_etd(draft_etd_df, first_lot_df, far_future_date):
     # Convert STATUS to uppercase for consistent comparison
     first_lot_df['STATUS'] = first_lot_df['STATUS'].str.strip().str.upper()
     
-    # Ensure all date columns are datetime objects
-    date_columns = ['OCD( Order Creation Day)', 'CHD', 'Draft ETD', 'DUE DATE']
-    for col in date_columns:
-        if col in draft_etd_df.columns:
-            draft_etd_df[col] = pd.to_datetime(draft_etd_df[col], errors='coerce')
-        if col in first_lot_df.columns:
-            first_lot_df[col] = pd.to_datetime(first_lot_df[col], errors='coerce')
-    
     # Print debug information after cleaning
     print("\nDebug: First few rows of first_lot_df after cleaning:")
     print(first_lot_df[['Greige Code', 'COLOR', 'STATUS', 'DUE DATE']].head())
     
     # Merge with 1st Lot Status data
-    first_lot_df_renamed = first_lot_df[['Greige Code', 'COLOR', 'STATUS', 'DUE DATE']].rename(
+    lot_cols = ['Greige Code', 'COLOR', 'STATUS', 'DUE DATE']
+    if 'Is_Due_Date_Never' in first_lot_df.columns:
+        lot_cols.append('Is_Due_Date_Never')
+    first_lot_df_renamed = first_lot_df[lot_cols].rename(
         columns={'STATUS': '1ST LOT STATUS'}
     )
     
@@ -61,33 +88,21 @@ def calculate_second_etd(draft_etd_df, first_lot_df, far_future_date):
     print(draft_etd_df_merged[['Greige Code', 'COLOR', '1ST LOT STATUS', 'DUE DATE', 'Draft ETD']].head())
     print("\nDebug: Number of rows in merged data:", len(draft_etd_df_merged))
 
+    # Lines without a matching lot (or input without the flag) have a real or missing DUE DATE
+    if 'Is_Due_Date_Never' in draft_etd_df_merged.columns:
+        draft_etd_df_merged['Is_Due_Date_Never'] = draft_etd_df_merged['Is_Due_Date_Never'].fillna(False).astype(bool)
+    else:
+        draft_etd_df_merged['Is_Due_Date_Never'] = False
+
     # Calculate 2nd ETD
     def get_2nd_etd(row):
-        draft_etd = row['Draft ETD']
-        lot_status = str(row['1ST LOT STATUS']).strip().upper() if pd.notna(row['1ST LOT STATUS']) else None
-        due_date = row['DUE DATE'] 
-
-        if pd.isna(draft_etd) or draft_etd == far_future_date:
-            return draft_etd 
-
-        if lot_status is None:
-            return draft_etd
-
-        if lot_status == 'OK':
-            return draft_etd
-        elif lot_status == 'EXPIRED':
-            if pd.isna(due_date):
-                return draft_etd
-            if due_date <= draft_etd:
-                return draft_etd
-            else: 
-                return due_date
-        return draft_etd
+        return second_etd_from_lot_status(row['Draft ETD'], row['1ST LOT STATUS'], row['DUE DATE'],
+                                          row['Is_Due_Date_Never'])
 
     draft_etd_df_merged['2nd ETD'] = draft_etd_df_merged.apply(get_2nd_etd, axis=1)
     
-    # Ensure 2nd ETD is datetime
-    draft_etd_df_merged['2nd ETD'] = pd.to_datetime(draft_etd_df_merged['2nd ETD'], errors='coerce')
+    # Keep 2nd ETD as day ordinals
+    draft_etd_df_merged['2nd ETD'] = pd.array(draft_etd_df_merged['2nd ETD'].tolist(), dtype=ORDINAL_DTYPE)
     
     print("Step 2 finished.")
     return draft_etd_df_merged 
\ No newline at end of file
@@ -0,0 +1,58 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+# The modules live flat at the repository root, as po_processor.py imports them
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+OCD_COL_NAME = "OCD( Order Creation Day)"
+
+def write_input_workbook(path, rows=50, seed=0, today=None, far_future_due_date=None):
+    """Writes a synthetic input workbook with the four sheets the pipeline reads.
+
+    Dates are spread around ``today`` (default: the current date). With
+    ``far_future_due_date``, the first 1ST LOT STATUS row is an EXPIRED lot due on that date.
+    """
+    rng = np.random.default_rng(seed)
+    codes = [f"G{i:03d}" for i in range(10)]
+    colors = ["RED", "BLUE", "GREEN"]
+    today = pd.Timestamp(today).normalize() if today is not None else pd.Timestamp.today().normalize()
+    stock = pd.DataFrame({
+        'Greige Code': rng.choice(codes, rows),
+        'Greige ETA': today + pd.to_timedelta(rng.integers(-20, 60, rows), 'D'),
+        'Greige Incoming': rng.integers(100, 3000, rows),
+    })
+    po = pd.DataFrame({
+        'SPL': 'x', 'FG name': 'fg', 'Season': 'S', 'Local/ Export': 'E',
+        'PO': [f"PO{i}" for i in range(rows)],
+        OCD_COL_NAME: today - pd.Timedelta(days=5),
+        'CHD': today + pd.to_timedelta(rng.integers(30, 120, rows), 'D'),
+        'Greige Code': rng.choice(codes, rows), 'Greige Name': 'name', 'ITEM': 'it',
+        'COLOR': rng.choice(colors, rows),
+        'Quantity request': rng.integers(200, 4000, rows),
+        'Forecasted': rng.choice(['yes', 'no'], rows),
+    })
+    first_lot = pd.DataFrame({
+        'Greige Code': codes, 'COLOR': rng.choice(colors, len(codes)),
+        'STATUS': rng.choice(['OK', 'EXPIRED'], len(codes)),
+        'DUE DATE': today + pd.to_timedelta(rng.integers(30, 200, len(codes)), 'D'),
+    })
+    if far_future_due_date is not None:
+        first_lot.loc[0, ['STATUS', 'DUE DATE']] = ['EXPIRED', pd.Timestamp(far_future_due_date)]
+    capacity = pd.DataFrame({
+        'CAPACITY DATE': pd.date_range(today, periods=200),
+        'CAPACITY REMAIN': rng.integers(-1000, 5000, 200),
+    })
+    with pd.ExcelWriter(path) as writer:
+        stock.to_excel(writer, sheet_name='Stock', index=False)
+        po.to_excel(writer, sheet_name='PO', index=False)
+        first_lot.to_excel(writer, sheet_name='1ST LOT STATUS', index=False)
+        capacity.to_excel(writer, sheet_name='Capacity Status', index=False)
+    return path
+
+@pytest.fixture
+def input_workbook(tmp_path):
+    """Path of a small synthetic input workbook."""
+    return str(write_input_workbook(tmp_path / 'input.xlsx'))
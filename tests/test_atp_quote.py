@@ -0,0 +1,121 @@
+import copy
+import math
+import pandas as pd
+import pytest
+from atp_quote import build_planning_state, parse_quote_lines, quote_lines
+from day_ordinals import date_to_day_ordinal, day_ordinal_to_date
+from step1_draft_etd import calculate_draft_etd_and_remaining_stock
+from step2_second_etd import calculate_second_etd
+from step3_final_etd import schedule_production_and_final_etd
+
+TODAY = date_to_day_ordinal(pd.Timestamp('2025-01-06'))
+LEAD_TIME_DAYS = 40
+CAPACITY_TOLERANCE = 2000
+MIN_CAPACITY_REMAIN = -2000
+OCD_COL_NAME = "OCD( Order Creation Day)"
+DISPLAY_STR = 'Insufficient Stock/Capacity'
+
+def planning_inputs():
+    """Stock, PO, 1st lot and capacity frames (dates as day ordinals) for a two-line run."""
+    stock_df = pd.DataFrame({
+        'Greige Code': ['G001', 'G001', 'G002'],
+        'Greige ETA': [TODAY - 5, TODAY + 20, TODAY - 1],
+        'Greige Incoming': [1500, 3000, 800],
+    })
+    po_df = pd.DataFrame({
+        'PO': ['PO1', 'PO2'], OCD_COL_NAME: [TODAY - 10, TODAY - 10], 'CHD': [TODAY + 60, TODAY + 70],
+        'Greige Code': ['G001', 'G002'], 'Greige Name': ['n1', 'n2'], 'ITEM': ['it', 'it'],
+        'COLOR': ['RED', 'BLUE'], 'Quantity request': [1200, 500], 'Forecasted': ['yes', 'yes'],
+    })
+    first_lot_df = pd.DataFrame({
+        'Greige Code': ['G001', 'G002'], 'COLOR': ['RED', 'BLUE'],
+        'STATUS': ['OK', 'EXPIRED'], 'DUE DATE': [TODAY + 10, TODAY + 90],
+    })
+    capacity_status_df = pd.DataFrame({
+        'CAPACITY DATE': list(range(TODAY, TODAY + 120)),
+        'CAPACITY REMAIN': [600] * 120,
+    })
+    return stock_df, po_df, first_lot_df, capacity_status_df
+
+def run_steps(stock_df, po_df, first_lot_df, capacity_status_df):
+    draft_etd_df, _, stock_state = calculate_draft_etd_and_remaining_stock(
+        stock_df, po_df, TODAY, LEAD_TIME_DAYS, OCD_COL_NAME, return_stock_state=True)
+    draft_etd_df_with_2nd_etd = calculate_second_etd(draft_etd_df.copy(), first_lot_df.copy())
+    final_etd_df, live_capacity = schedule_production_and_final_etd(
+        draft_etd_df_with_2nd_etd, capacity_status_df, TODAY, LEAD_TIME_DAYS,
+        CAPACITY_TOLERANCE, MIN_CAPACITY_REMAIN, return_live_capacity=True)
+    return final_etd_df, stock_state, live_capacity
+
+@pytest.fixture
+def planning_state():
+    stock_df, po_df, first_lot_df, capacity_status_df = planning_inputs()
+    _, stock_state, live_capacity = run_steps(stock_df, po_df, first_lot_df, capacity_status_df)
+    return build_planning_state(stock_state, first_lot_df, live_capacity, TODAY, LEAD_TIME_DAYS,
+                                CAPACITY_TOLERANCE, MIN_CAPACITY_REMAIN, DISPLAY_STR)
+
+def test_quote_matches_a_full_run_with_the_line_added(planning_state):
+    # A line with the lowest priority in Steps 1 and 3 (not forecasted, latest CHD, stock from
+    # the last incoming batch) is quoted exactly as a full run would schedule it
+    stock_df, po_df, first_lot_df, capacity_status_df = planning_inputs()
+    new_line = {'PO': 'PO3', OCD_COL_NAME: TODAY, 'CHD': TODAY + 100, 'Greige Code': 'G001',
+                'Greige Name': 'n1', 'ITEM': 'it', 'COLOR': 'RED', 'Quantity request': 1400, 'Forecasted': 'no'}
+    final_etd_df, _, _ = run_steps(stock_df, pd.concat([po_df, pd.DataFrame([new_line])], ignore_index=True),
+                                   first_lot_df, capacity_status_df)
+    expected = final_etd_df[final_etd_df['PO'] == 'PO3'].iloc[0]
+
+    lines = parse_quote_lines({'Greige Code': 'G001', 'COLOR': 'RED', 'quantity': 1400,
+                               'CHD': day_ordinal_to_date(TODAY + 100).strftime('%Y-%m-%d')})
+    [quote] = quote_lines(planning_state, lines)
+
+    for col in ['Draft ETD', '2nd ETD', 'FINAL ETD', 'DATE 1ST BATCH', 'DATE 2ND BATCH']:
+        expected_value = None if pd.isna(expected[col]) else day_ordinal_to_date(expected[col]).strftime('%Y-%m-%d')
+        if expected_value is None and col in ('Draft ETD', '2nd ETD', 'FINAL ETD'):
+            expected_value = DISPLAY_STR
+        assert quote[col] == expected_value, col
+    assert quote['FINAL QUANTITY'] == expected['FINAL QUANTITY']
+
+def test_quote_does_not_change_the_planning_state(planning_state):
+    before = copy.deepcopy(planning_state)
+    lines = parse_quote_lines({'lines': [
+        {'Greige Code': 'G001', 'COLOR': 'RED', 'quantity': 2500, 'CHD': '2025-04-01'},
+        {'Greige Code': 'G002', 'COLOR': 'BLUE', 'quantity': 300, 'CHD': '2025-03-01'},
+    ]})
+    assert len(quote_lines(planning_state, lines)) == 2
+    assert planning_state == before
+
+def test_quote_without_stock_is_insufficient(planning_state):
+    [quote] = quote_lines(planning_state, parse_quote_lines(
+        {'Greige Code': 'UNKNOWN', 'COLOR': 'RED', 'quantity': 100, 'CHD': '2025-03-01'}))
+    assert quote['Draft ETD'] == quote['FINAL ETD'] == DISPLAY_STR
+
+def test_numeric_greige_codes_match_whatever_type_they_were_read_as():
+    stock_state = {12345.0: {'available_on_hand': 1000, 'incoming_batches': []}}
+    first_lot_df = pd.DataFrame({'Greige Code': ['12345.0'], 'COLOR': ['RED'], 'STATUS': ['OK'], 'DUE DATE': [None]})
+    state = build_planning_state(stock_state, first_lot_df, {TODAY: 5000}, TODAY, LEAD_TIME_DAYS,
+                                 CAPACITY_TOLERANCE, MIN_CAPACITY_REMAIN, DISPLAY_STR)
+    [quote] = quote_lines(state, parse_quote_lines(
+        {'Greige Code': '12345', 'COLOR': 'RED', 'quantity': 100, 'CHD': '2025-03-01'}))
+    assert quote['Draft ETD'] == day_ordinal_to_date(TODAY + LEAD_TIME_DAYS).strftime('%Y-%m-%d')
+    assert quote['1ST LOT STATUS'] == 'OK'
+
+def test_parse_quote_lines_accepts_one_line_or_a_batch():
+    line = {'Greige Code': ' G001 ', 'COLOR': 'RED  LIGHT', 'Quantity request': '250', 'CHD': '2025-03-01'}
+    [parsed] = parse_quote_lines(line)
+    assert parsed == {'Greige Code': 'G001', 'COLOR': 'RED LIGHT', 'Quantity request': 250,
+                      'CHD': date_to_day_ordinal(pd.Timestamp('2025-03-01'))}
+    assert len(parse_quote_lines({'lines': [line, line]})) == 2
+
+@pytest.mark.parametrize('payload, message', [
+    ({'lines': []}, "non-empty 'lines' list"),
+    ({'lines': ['G001']}, 'expected an object'),
+    ({'COLOR': 'RED', 'quantity': 1, 'CHD': '2025-03-01'}, 'missing Greige Code'),
+    ({'Greige Code': 'G001', 'COLOR': 'RED', 'CHD': '2025-03-01'}, 'missing quantity'),
+    ({'Greige Code': 'G001', 'COLOR': 'RED', 'quantity': 0, 'CHD': '2025-03-01'}, 'positive, finite'),
+    ({'Greige Code': 'G001', 'COLOR': 'RED', 'quantity': 'abc', 'CHD': '2025-03-01'}, 'positive, finite'),
+    ({'Greige Code': 'G001', 'COLOR': 'RED', 'quantity': math.inf, 'CHD': '2025-03-01'}, 'positive, finite'),
+    ({'Greige Code': 'G001', 'COLOR': 'RED', 'quantity': 'NaN', 'CHD': '2025-03-01'}, 'positive, finite'),
+    ({'Greige Code': 'G001', 'COLOR': 'RED', 'quantity': 10, 'CHD': 'not a date'}, 'CHD is not a valid date'),
+])
+def test_parse_quote_lines_rejects_malformed_lines(payload, message):
+    with pytest.raises(ValueError, match=message):
+        parse_quote_lines(payload)
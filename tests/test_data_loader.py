@@ -0,0 +1,62 @@
+import datetime
+import io
+import zipfile
+import numpy as np
+import pandas as pd
+from data_loader import INPUT_SHEET_NAMES, load_and_prepare_data, normalize_date_column, split_workbook_by_sheet
+from conftest import OCD_COL_NAME
+
+def test_parallel_load_matches_serial_load(input_workbook):
+    serial = load_and_prepare_data(input_workbook, OCD_COL_NAME)
+    parallel = load_and_prepare_data(input_workbook, OCD_COL_NAME, parallel=True, max_workers=2)
+    for serial_df, parallel_df in zip(serial, parallel):
+        assert serial_df.equals(parallel_df)
+
+def test_split_workbook_keeps_only_own_sheet_uncompressed(input_workbook):
+    with open(input_workbook, 'rb') as f:
+        packages = split_workbook_by_sheet(f.read(), INPUT_SHEET_NAMES)
+    assert set(packages) == set(INPUT_SHEET_NAMES)
+    for package in packages.values():
+        with zipfile.ZipFile(io.BytesIO(package)) as archive:
+            worksheets = [info for info in archive.infolist() if info.filename.startswith('xl/worksheets/')]
+            assert len(worksheets) == 1
+            assert all(info.compress_type == zipfile.ZIP_STORED for info in archive.infolist())
+
+def test_split_workbook_falls_back_to_whole_workbook_for_unknown_sheet(input_workbook):
+    with open(input_workbook, 'rb') as f:
+        workbook_bytes = f.read()
+    assert split_workbook_by_sheet(workbook_bytes, ['Missing'])['Missing'] == workbook_bytes
+
+def test_normalize_date_column_reads_mixed_values():
+    values = pd.Series([datetime.datetime(2025, 1, 6), 45663, '45664', '2025-01-09', '10/01/2025', '  ', None],
+                       dtype=object)
+    dates, unparsed = normalize_date_column(values)
+    assert dates.tolist()[:5] == [pd.Timestamp(day) for day in
+                                  ['2025-01-06', '2025-01-06', '2025-01-07', '2025-01-09', '2025-01-10']]
+    assert dates[5:].isna().all()
+    assert unparsed == 0
+
+def test_normalize_date_column_reads_numeric_columns_as_serials():
+    dates, unparsed = normalize_date_column(pd.Series([45663, 45664], dtype='int64'))
+    assert dates.tolist() == [pd.Timestamp('2025-01-06'), pd.Timestamp('2025-01-07')]
+    dates, unparsed = normalize_date_column(pd.Series([45663.0, np.nan]))
+    assert dates[0] == pd.Timestamp('2025-01-06') and pd.isna(dates[1])
+    assert unparsed == 0
+
+def test_normalize_date_column_leaves_unmatched_text_unparsed():
+    # "2024" is a year, not serial 2024 (1905-07-16); no format matches the other two
+    values = pd.Series(['2024', 'Jan 6th 2025', 'TBC', '06/01/2025'])
+    dates, unparsed = normalize_date_column(values)
+    assert dates[:3].isna().all()
+    assert dates[3] == pd.Timestamp('2025-01-06')
+    assert unparsed == 3
+
+def test_normalize_date_column_uses_configured_formats_in_order():
+    dates, _ = normalize_date_column(pd.Series(['03/04/2025']), string_formats=['%m/%d/%Y', '%d/%m/%Y'])
+    assert dates[0] == pd.Timestamp('2025-03-04')
+
+def test_normalize_date_column_keeps_datetime_columns():
+    values = pd.Series(pd.to_datetime(['2025-01-06', None]))
+    dates, unparsed = normalize_date_column(values)
+    assert dates.equals(values.astype('datetime64[ns]'))
+    assert unparsed == 0
@@ -0,0 +1,47 @@
+import pandas as pd
+from day_ordinals import (ORDINAL_DTYPE, convert_planning_dates_to_ordinals, date_to_day_ordinal,
+                          day_ordinal_to_date, format_day_ordinals, from_day_ordinals, to_day_ordinals)
+from step2_second_etd import second_etd_from_lot_status
+
+FAR_FUTURE_DATE = pd.Timestamp('2200-12-31')
+OCD_COL_NAME = "OCD( Order Creation Day)"
+
+def test_ordinals_round_trip_to_the_same_dates():
+    dates = pd.Series([pd.Timestamp('1970-01-01'), pd.Timestamp('2024-02-29'), pd.Timestamp('2025-01-06 15:30'), pd.NaT])
+    ordinals = to_day_ordinals(dates)
+    assert str(ordinals.dtype) == ORDINAL_DTYPE
+    assert ordinals.tolist()[:3] == [0, 19782, 20094]
+    assert ordinals.isna().tolist() == [False, False, False, True]
+    assert from_day_ordinals(ordinals).tolist()[:3] == list(dates.dt.normalize()[:3])
+    assert pd.isna(from_day_ordinals(ordinals).iloc[3])
+
+def test_scalar_conversions_round_trip():
+    for value in ['1999-12-31', '2025-01-06', '2199-06-30']:
+        ordinal = date_to_day_ordinal(value)
+        assert day_ordinal_to_date(ordinal) == pd.Timestamp(value)
+    assert date_to_day_ordinal(None) is None
+    assert pd.isna(day_ordinal_to_date(None))
+
+def test_far_future_sentinel_becomes_null():
+    ordinals = to_day_ordinals(pd.Series([pd.Timestamp('2025-01-06'), FAR_FUTURE_DATE]), FAR_FUTURE_DATE)
+    assert ordinals.isna().tolist() == [False, True]
+
+def test_format_shows_the_given_text_for_null_dates():
+    ordinals = pd.Series([20094, None], dtype=ORDINAL_DTYPE)
+    assert format_day_ordinals(ordinals, 'No date').tolist() == ['2025-01-06', 'No date']
+
+def test_far_future_due_date_is_flagged_as_never():
+    empty = pd.DataFrame({'Greige ETA': [], 'CHD': [], OCD_COL_NAME: [], 'CAPACITY DATE': []})
+    first_lot_df = pd.DataFrame({'DUE DATE': [pd.Timestamp('2025-03-01'), FAR_FUTURE_DATE, pd.NaT]})
+    _, _, first_lot_df, _ = convert_planning_dates_to_ordinals(
+        empty, empty, first_lot_df, empty, OCD_COL_NAME, FAR_FUTURE_DATE)
+
+    assert first_lot_df['DUE DATE'].isna().tolist() == [False, True, True]
+    assert first_lot_df['Is_Due_Date_Never'].tolist() == [False, True, False]
+
+def test_expired_lot_due_never_has_no_2nd_etd_but_a_missing_due_date_is_ignored():
+    draft_etd = date_to_day_ordinal('2025-03-01')
+    assert second_etd_from_lot_status(draft_etd, 'EXPIRED', None, due_date_never=True) is None
+    assert second_etd_from_lot_status(draft_etd, 'EXPIRED', None) == draft_etd
+    assert second_etd_from_lot_status(draft_etd, 'EXPIRED', draft_etd + 10) == draft_etd + 10
+    assert second_etd_from_lot_status(draft_etd, 'OK', None, due_date_never=True) == draft_etd
@@ -0,0 +1,54 @@
+import pandas as pd
+from delta_report import (SNAPSHOT_KEY_COLS, build_result_snapshot, compute_etd_delta,
+                          load_result_snapshot, save_result_snapshot)
+from day_ordinals import ORDINAL_DTYPE
+from step1_draft_etd import PO_ROW_COL
+
+def final_etd_frame(rows):
+    """Builds a minimal Step 3 output from (PO, Greige Code, COLOR, quantity, PO row, FINAL ETD) tuples."""
+    df = pd.DataFrame(rows, columns=['PO', 'Greige Code', 'COLOR', 'Quantity request', PO_ROW_COL, 'FINAL ETD'])
+    df['ITEM'] = 'it'
+    for col in ['Draft ETD', '2nd ETD', 'FINAL ETD', 'DATE 1ST BATCH', 'DATE 2ND BATCH']:
+        values = df[col] if col in df.columns else [None] * len(df)
+        df[col] = pd.array(list(values), dtype=ORDINAL_DTYPE)
+    df['DEVIDED QUANTITY 1ST'] = df['Quantity request']
+    df['DEVIDED QUANTITY 2ND'] = 0
+    return df
+
+BASE_ROWS = [
+    ('PO1', 'G001', 'RED', 500, 0, 740000),
+    ('PO1', 'G001', 'RED', 900, 1, 740010),
+    ('PO2', 'G002', 'BLUE', 300, 2, 740020),
+]
+
+def test_identical_runs_have_no_delta():
+    snapshot = build_result_snapshot(final_etd_frame(BASE_ROWS))
+    assert compute_etd_delta(snapshot, snapshot.copy()).empty
+
+def test_delta_reports_new_removed_and_changed_lines():
+    previous = build_result_snapshot(final_etd_frame(BASE_ROWS))
+    current_rows = [BASE_ROWS[0], ('PO1', 'G001', 'RED', 900, 1, 740015), ('PO3', 'G003', 'GREEN', 100, 2, 740030)]
+    delta = compute_etd_delta(previous, build_result_snapshot(final_etd_frame(current_rows)))
+
+    changes = {(row['PO'], row['LINE NO']): row['CHANGE'] for _, row in delta.iterrows()}
+    assert changes == {('PO1', 1): 'CHANGED', ('PO2', 0): 'REMOVED', ('PO3', 0): 'NEW'}
+    changed = delta[delta['CHANGE'] == 'CHANGED'].iloc[0]
+    assert changed['FINAL ETD (PREVIOUS)'] == 740010
+    assert changed['FINAL ETD (CURRENT)'] == 740015
+
+def test_quantity_change_on_repeated_key_keeps_line_numbers():
+    # The first of two identical PO lines grows past the second; lines are numbered by
+    # sheet order, so only that line is reported and no line swaps numbers
+    previous = build_result_snapshot(final_etd_frame(BASE_ROWS))
+    current_rows = [('PO1', 'G001', 'RED', 1200, 0, 740000), *BASE_ROWS[1:]]
+    current = build_result_snapshot(final_etd_frame(current_rows))
+
+    assert previous[SNAPSHOT_KEY_COLS].equals(current[SNAPSHOT_KEY_COLS])
+    delta = compute_etd_delta(previous, current)
+    assert delta[['PO', 'LINE NO', 'CHANGE']].values.tolist() == [['PO1', 0, 'CHANGED']]
+
+def test_snapshot_round_trips_through_csv(tmp_path):
+    snapshot = build_result_snapshot(final_etd_frame(BASE_ROWS))
+    snapshot_file = tmp_path / 'snapshot.csv'
+    save_result_snapshot(snapshot, snapshot_file)
+    assert compute_etd_delta(snapshot, load_result_snapshot(snapshot_file)).empty
@@ -0,0 +1,44 @@
+import io
+import os
+import pandas as pd
+import pytest
+import config
+from conftest import write_input_workbook
+from po_processor import process_fabric_management
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+# The golden sheets were written by the original Timestamp-based pipeline for this input
+GOLDEN_TODAY = '2025-01-06'
+GOLDEN_SHEETS = {'DRAFT ETD': 'golden_draft_etd.csv', 'REMAINING STOCK': 'golden_remaining_stock.csv',
+                 'FINAL ETD': 'golden_final_etd.csv'}
+
+@pytest.fixture
+def golden_input(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'TODAY_DATE', pd.Timestamp(GOLDEN_TODAY))
+    return str(write_input_workbook(tmp_path / 'golden_input.xlsx', rows=80, seed=23, today=GOLDEN_TODAY,
+                                    far_future_due_date=config.FAR_FUTURE_DATE_STR))
+
+def read_sheet_as_csv(output_file, sheet_name):
+    # Compare through CSV, as the golden files were saved, so both sides get the same types
+    buffer = io.StringIO()
+    pd.read_excel(output_file, sheet_name=sheet_name).to_csv(buffer, index=False)
+    buffer.seek(0)
+    return pd.read_csv(buffer)
+
+def test_output_matches_golden_sheets(golden_input, tmp_path):
+    output_file = str(tmp_path / 'output.xlsx')
+    process_fabric_management(golden_input, output_file)
+
+    for sheet_name, golden_file in GOLDEN_SHEETS.items():
+        expected = pd.read_csv(os.path.join(DATA_DIR, golden_file))
+        pd.testing.assert_frame_equal(read_sheet_as_csv(output_file, sheet_name), expected, obj=sheet_name)
+
+def test_unscheduled_dates_show_the_configured_text(golden_input, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'FAR_FUTURE_DATE_DISPLAY_STR', 'Not scheduled')
+    output_file = str(tmp_path / 'output.xlsx')
+    process_fabric_management(golden_input, output_file)
+
+    expected = pd.read_csv(os.path.join(DATA_DIR, GOLDEN_SHEETS['FINAL ETD']))
+    final_etd = read_sheet_as_csv(output_file, 'FINAL ETD')
+    assert (final_etd['FINAL ETD'] == 'Not scheduled').sum() == (expected['FINAL ETD'] == 'Insufficient Stock/Capacity').sum() > 0
+    assert not final_etd.isin(['Insufficient Stock/Capacity']).any().any()
@@ -0,0 +1,150 @@
+import os
+import time
+import pandas as pd
+from pipeline_stages import make_stage, run_stages, prune_stage_cache
+
+def build_stages(calls, scale=2):
+    """Two chained stages over a DataFrame source; calls counts how often each one ran."""
+    def double(frame):
+        calls['double'] += 1
+        return frame.assign(value=frame['value'] * scale)
+
+    def total(frame):
+        calls['total'] += 1
+        return pd.DataFrame({'total': [frame['value'].sum()]}), {'rows': len(frame)}
+
+    return [
+        make_stage('double', ['source_df'], ['doubled_df'], double, params={'scale': scale},
+                   content_fingerprint=True),
+        make_stage('total', ['doubled_df'], ['total_df', 'summary'], total),
+    ]
+
+def source(values):
+    frame = pd.DataFrame({'value': values})
+    return {'source_df': (frame, '-'.join(str(value) for value in values))}
+
+def new_calls():
+    return {'double': 0, 'total': 0}
+
+def test_cache_miss_runs_every_stage_and_materializes_outputs(tmp_path):
+    calls = new_calls()
+    artifacts = run_stages(build_stages(calls), source([1, 2, 3]), cache_dir=tmp_path)
+
+    assert calls == {'double': 1, 'total': 1}
+    assert artifacts['total_df']['total'].tolist() == [12]
+    assert artifacts['summary'] == {'rows': 3}
+    assert sorted(name for name in os.listdir(tmp_path / 'total' / os.listdir(tmp_path / 'total')[0])) == \
+        ['_COMPLETE', 'summary.pkl', 'total_df.parquet']
+
+def test_cache_hit_loads_outputs_instead_of_running(tmp_path):
+    run_stages(build_stages(new_calls()), source([1, 2, 3]), cache_dir=tmp_path)
+    calls = new_calls()
+    artifacts = run_stages(build_stages(calls), source([1, 2, 3]), cache_dir=tmp_path)
+
+    assert calls == {'double': 0, 'total': 0}
+    assert artifacts['total_df']['total'].tolist() == [12]
+    assert artifacts['summary'] == {'rows': 3}
+
+def test_changed_input_invalidates_the_cache(tmp_path):
+    run_stages(build_stages(new_calls()), source([1, 2, 3]), cache_dir=tmp_path)
+    calls = new_calls()
+    artifacts = run_stages(build_stages(calls), source([1, 2, 4]), cache_dir=tmp_path)
+
+    assert calls == {'double': 1, 'total': 1}
+    assert artifacts['total_df']['total'].tolist() == [14]
+
+def test_changed_param_invalidates_the_stage_and_its_dependents(tmp_path):
+    run_stages(build_stages(new_calls()), source([1, 2, 3]), cache_dir=tmp_path)
+    calls = new_calls()
+    artifacts = run_stages(build_stages(calls, scale=3), source([1, 2, 3]), cache_dir=tmp_path)
+
+    assert calls == {'double': 1, 'total': 1}
+    assert artifacts['total_df']['total'].tolist() == [18]
+
+def test_content_fingerprint_keeps_dependents_cached_when_output_is_unchanged(tmp_path):
+    # Same values under a different source fingerprint: 'double' re-runs, but its output
+    # is identical, so 'total' is still loaded from the cache
+    run_stages(build_stages(new_calls()), source([1, 2, 3]), cache_dir=tmp_path)
+    frame = pd.DataFrame({'value': [1, 2, 3]})
+    calls = new_calls()
+    run_stages(build_stages(calls), {'source_df': (frame, 'another-file')}, cache_dir=tmp_path)
+
+    assert calls == {'double': 1, 'total': 0}
+
+def test_rerun_from_forces_the_stage_and_everything_downstream(tmp_path):
+    run_stages(build_stages(new_calls()), source([1, 2, 3]), cache_dir=tmp_path)
+    calls = new_calls()
+    run_stages(build_stages(calls), source([1, 2, 3]), cache_dir=tmp_path, rerun_from='double')
+
+    assert calls == {'double': 1, 'total': 1}
+
+def test_incomplete_entry_is_not_loaded(tmp_path):
+    run_stages(build_stages(new_calls()), source([1, 2, 3]), cache_dir=tmp_path)
+    entry_dir = tmp_path / 'total' / os.listdir(tmp_path / 'total')[0]
+    os.remove(entry_dir / '_COMPLETE')
+    calls = new_calls()
+    run_stages(build_stages(calls), source([1, 2, 3]), cache_dir=tmp_path)
+
+    assert calls == {'double': 0, 'total': 1}
+
+def age_entries(cache_dir, age_seconds):
+    timestamp = time.time() - age_seconds
+    for root, _, files in os.walk(cache_dir):
+        for name in files:
+            os.utime(os.path.join(root, name), (timestamp, timestamp))
+
+def test_prune_removes_expired_entries(tmp_path):
+    run_stages(build_stages(new_calls()), source([1, 2, 3]), cache_dir=tmp_path)
+    age_entries(tmp_path, 7200)
+    run_stages(build_stages(new_calls()), source([4, 5, 6]), cache_dir=tmp_path)
+
+    result = prune_stage_cache(tmp_path, max_age_seconds=3600)
+    assert result['removed_entries'] == 2
+    assert len(os.listdir(tmp_path / 'double')) == 1
+    assert len(os.listdir(tmp_path / 'total')) == 1
+
+def cache_size(cache_dir):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(cache_dir) for name in files)
+
+def test_prune_evicts_least_recently_used_entries_until_under_size_cap(tmp_path):
+    run_stages(build_stages(new_calls()), source([1, 2, 3]), cache_dir=tmp_path)
+    age_entries(tmp_path / 'double', 900)
+    age_entries(tmp_path / 'total', 600)
+    run_stages(build_stages(new_calls()), source([4, 5, 6]), cache_dir=tmp_path)
+
+    result = prune_stage_cache(tmp_path, max_bytes=cache_size(tmp_path) - 1)
+    assert result['removed_entries'] == 1
+
+    # Only the oldest entry (the first run's 'double') is gone
+    calls = new_calls()
+    run_stages(build_stages(calls), source([1, 2, 3]), cache_dir=tmp_path)
+    assert calls == {'double': 1, 'total': 0}
+
+def test_run_prunes_the_cache_but_keeps_its_own_entries(tmp_path):
+    run_stages(build_stages(new_calls()), source([1, 2, 3]), cache_dir=tmp_path)
+    run_stages(build_stages(new_calls()), source([4, 5, 6]), cache_dir=tmp_path, cache_max_bytes=0)
+
+    calls = new_calls()
+    run_stages(build_stages(calls), source([4, 5, 6]), cache_dir=tmp_path)
+    assert calls == {'double': 0, 'total': 0}
+    calls = new_calls()
+    run_stages(build_stages(calls), source([1, 2, 3]), cache_dir=tmp_path)
+    assert calls == {'double': 1, 'total': 1}
+
+def test_loading_an_entry_marks_it_recently_used(tmp_path):
+    run_stages(build_stages(new_calls()), source([1, 2, 3]), cache_dir=tmp_path)
+    age_entries(tmp_path, 7200)
+    run_stages(build_stages(new_calls()), source([1, 2, 3]), cache_dir=tmp_path)
+
+    result = prune_stage_cache(tmp_path, max_age_seconds=3600)
+    assert result['removed_entries'] == 0
+
+def test_prune_removes_leftover_scratch_directories(tmp_path):
+    scratch = tmp_path / 'double' / 'abc.tmp-123'
+    scratch.mkdir(parents=True)
+    (scratch / 'doubled_df.parquet').write_bytes(b'x' * 10)
+    age_entries(tmp_path, 7200)
+
+    result = prune_stage_cache(tmp_path, max_age_seconds=3600)
+    assert result['removed_entries'] == 1
+    assert not scratch.exists()
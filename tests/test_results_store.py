@@ -0,0 +1,64 @@
+import pandas as pd
+import pytest
+from po_processor import process_fabric_management
+from results_store import load_result_table, parse_results_query, query_results, result_file_path, save_job_results
+from conftest import OCD_COL_NAME
+
+@pytest.fixture
+def final_etd_table(input_workbook, tmp_path):
+    results_prefix = str(tmp_path / 'job')
+    process_fabric_management(input_workbook, str(tmp_path / 'output.xlsx'), results_store_prefix=results_prefix)
+    path = result_file_path(results_prefix, 'final-etd')
+    assert path.endswith('.parquet')
+    return load_result_table(path)
+
+def run_query(table, sheet='final-etd', **args):
+    return query_results(table, parse_results_query(args, sheet))
+
+def test_cursor_pages_through_every_row_once(final_etd_table):
+    everything = run_query(final_etd_table, limit='1000')
+    assert everything['next_cursor'] is None
+
+    rows, cursor = [], None
+    while True:
+        page = run_query(final_etd_table, limit='7', **({'cursor': cursor} if cursor else {}))
+        assert page['total'] == everything['total']
+        rows.extend(page['rows'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert rows == everything['rows']
+
+def test_cursor_keeps_the_sort_order(final_etd_table):
+    first = run_query(final_etd_table, sort='-Quantity request', limit='10')
+    second = run_query(final_etd_table, sort='-Quantity request', limit='10', cursor=first['next_cursor'])
+    quantities = [row['Quantity request'] for row in first['rows'] + second['rows']]
+    assert quantities == sorted(quantities, reverse=True)
+
+def test_cursor_from_another_query_is_rejected(final_etd_table):
+    page = run_query(final_etd_table, limit='5')
+    with pytest.raises(ValueError, match='Cursor does not belong'):
+        run_query(final_etd_table, limit='5', sort='PO', cursor=page['next_cursor'])
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        run_query(final_etd_table, cursor='not-a-cursor')
+
+def test_filters_are_exact_and_case_insensitive(final_etd_table):
+    po = final_etd_table.df['PO'].iloc[0]
+    page = run_query(final_etd_table, po=f"  {str(po).lower()} ", limit='1000')
+    assert page['total'] == int((final_etd_table.df['PO'] == po).sum()) > 0
+    assert {row['PO'] for row in page['rows']} == {po}
+
+def test_etd_range_filter_skips_unscheduled_rows(final_etd_table):
+    page = run_query(final_etd_table, etd_from='2000-01-01', limit='1000')
+    assert page['total'] == int(final_etd_table.df['FINAL ETD'].notna().sum())
+    assert all(row['FINAL ETD'] is not None for row in page['rows'])
+
+def test_mixed_type_column_is_stored_as_text(tmp_path):
+    remaining_stock = pd.DataFrame({'Greige Code': [101, 'G-102', None], 'Remaining Stock': [1.0, 2.0, 3.0]},
+                                   dtype=object).astype({'Remaining Stock': float})
+    empty = pd.DataFrame()
+    save_job_results(str(tmp_path / 'job'), empty, remaining_stock, empty, OCD_COL_NAME)
+
+    table = load_result_table(result_file_path(str(tmp_path / 'job'), 'remaining-stock'))
+    assert table.df['Greige Code'].tolist()[:2] == ['101', 'G-102']
+    assert pd.isna(table.df['Greige Code'].iloc[2])
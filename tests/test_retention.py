@@ -0,0 +1,86 @@
+import os
+import time
+import uuid
+from retention import RetentionManager
+
+def make_job_file(folder, name, size, age_seconds, job_id=None):
+    """Creates a job file of the given size whose access and modification times are age_seconds ago."""
+    path = os.path.join(folder, f"{job_id or uuid.uuid4()}_{name}")
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    timestamp = time.time() - age_seconds
+    os.utime(path, (timestamp, timestamp))
+    return path
+
+def test_sweep_removes_expired_files(tmp_path):
+    manager = RetentionManager([tmp_path], max_bytes=10_000, max_age_seconds=3600)
+    old = make_job_file(tmp_path, 'old.xlsx', 100, age_seconds=7200)
+    recent = make_job_file(tmp_path, 'recent.xlsx', 100, age_seconds=60)
+
+    result = manager.sweep()
+    assert not os.path.exists(old)
+    assert os.path.exists(recent)
+    assert result['removed_files'] == 1
+
+def test_sweep_evicts_least_recently_used_until_under_size_cap(tmp_path):
+    manager = RetentionManager([tmp_path], max_bytes=250, max_age_seconds=3600)
+    oldest = make_job_file(tmp_path, 'a.xlsx', 100, age_seconds=300)
+    middle = make_job_file(tmp_path, 'b.xlsx', 100, age_seconds=200)
+    newest = make_job_file(tmp_path, 'c.xlsx', 100, age_seconds=100)
+
+    result = manager.sweep()
+    assert [os.path.exists(path) for path in (oldest, middle, newest)] == [False, True, True]
+    assert result['total_bytes_after'] == 200
+
+def test_touch_keeps_a_file_longer(tmp_path):
+    manager = RetentionManager([tmp_path], max_bytes=150, max_age_seconds=3600)
+    served = make_job_file(tmp_path, 'a.xlsx', 100, age_seconds=300)
+    other = make_job_file(tmp_path, 'b.xlsx', 100, age_seconds=200)
+    manager.touch(served)
+
+    manager.sweep()
+    assert os.path.exists(served)
+    assert not os.path.exists(other)
+
+def test_sweep_never_removes_protected_paths(tmp_path):
+    manager = RetentionManager([tmp_path], max_bytes=0, max_age_seconds=0)
+    protected = make_job_file(tmp_path, 'output.xlsx', 100, age_seconds=7200)
+    other = make_job_file(tmp_path, 'other.xlsx', 100, age_seconds=7200)
+
+    result = manager.sweep(protect=[protected])
+    assert os.path.exists(protected)
+    assert not os.path.exists(other)
+    assert result['total_bytes_after'] == 100 # Protected files still count
+
+def test_sweep_keeps_files_of_running_jobs_until_released(tmp_path):
+    manager = RetentionManager([tmp_path], max_bytes=0, max_age_seconds=0)
+    job_id = str(uuid.uuid4())
+    job_files = [make_job_file(tmp_path, name, 100, age_seconds=7200, job_id=job_id)
+                 for name in ('input.xlsx', 'config.py', 'results_final-etd.parquet')]
+
+    manager.begin_job(job_id)
+    manager.sweep()
+    assert all(os.path.exists(path) for path in job_files)
+
+    manager.end_job(job_id)
+    manager.sweep()
+    assert not any(os.path.exists(path) for path in job_files)
+
+def test_sweep_keeps_files_younger_than_the_grace_period(tmp_path):
+    manager = RetentionManager([tmp_path], max_bytes=0, max_age_seconds=0, min_age_seconds=600)
+    young = make_job_file(tmp_path, 'input.xlsx', 100, age_seconds=60)
+    old = make_job_file(tmp_path, 'output.xlsx', 100, age_seconds=7200)
+
+    manager.sweep()
+    assert os.path.exists(young)
+    assert not os.path.exists(old)
+
+def test_sweep_ignores_files_not_created_by_the_app(tmp_path):
+    manager = RetentionManager([tmp_path], max_bytes=0, max_age_seconds=0)
+    foreign = tmp_path / 'planning_state.pkl'
+    foreign.write_bytes(b'x' * 100)
+    os.utime(foreign, (time.time() - 7200, time.time() - 7200))
+
+    assert manager.sweep()['removed_files'] == 0
+    assert foreign.exists()
+    assert manager.usage()['file_count'] == 0